@@ -1,89 +1,14 @@
 # -*- coding: utf-8 -*-
 
-import os, sys, string
+import os, string
 from ruamel.yaml import YAML
+import pipeline
+from pipeline import bpe, set_version
+from pipeline.normalization import normalize, get_words
+from pipeline.ph_mark import mark, unmark, strip_markers
 
 os.environ["MKL_CBWR"] = "AUTO,STRICT" # Batchtranslations sollen nicht von der Übersetzung einzelner Sätze abweichen
 
-def eprint(*args, **kwargs):
-	print(*args, file=sys.stderr, **kwargs)
-
-def set_version(vstore):
-	import datetime
-	version = open(vstore, 'r').readline()
-	v_num, v_date = version.split()
-	f_date = str(datetime.datetime.fromtimestamp(os.stat(__file__).st_mtime)).split()[0]
-	if not v_date == f_date:
-		major, minor = v_num.rsplit('.', 1)
-		version = f'{major}.{int(minor) + 1} {f_date}'
-		with open(vstore, 'w') as f: f.write(version)
-	return version
-
-from urlextract import URLExtract
-extractor = URLExtract()
-for l, r in ('„','“'), ('‚','‘'), ('(', ')'), (' ', '.'), (' ', '?'), (' ', '!'), (' ', ','), (' ', ')'):
-	extractor.add_enclosure(l, r)
-
-import re
-EMOJI_PATTERN = (
-	r"[\U0001F600-\U0001F64F]|" # emoticons
-	r"[\U0001F300-\U0001F5FF]|" # symbols & pictographs
-	r"[\U0001F680-\U0001F6FF]|" # transport & map symbols
-	r"[\U0001F1E0-\U0001F1FF]|" # flags (iOS)
-	r"[\U0001f926-\U0001f937]|"
-	r"[\U00010000-\U0010ffff]"
-)
-MAIL_PATTERN    = r"[A-zěłó0-9\.\-+_]+@[A-z0-9\.\-+_]+\.[A-z]+"
-HASHTAG_PATTERN = r"#[^ !@#$%^&*(),.?\":{}|<>“]+"
-QUOTE_PATTERN   = r"[„“‚‘»«›‹”’]"
-
-PH_MARK = '⟦⟧' # MATHEMATICAL SQUARE BRACKETS (U+27E6, Ps): ⟦; (U+27E7, Pe): ⟧
-
-# Funktion zum Setzen der NE-Marker
-# gibt mit Platzhaltern versehenen Satz und Rückübersetzungsinformation zurück
-def set_markers(sentence):
-	positions = dict()
-	for url in extractor.find_urls(sentence):
-		positions[sentence.find(url)] = url
-		sentence = sentence.replace(url, PH_MARK, 1)
-
-	for entity in re.findall(rf"{MAIL_PATTERN}|{HASHTAG_PATTERN}|{EMOJI_PATTERN}", sentence):
-		positions[sentence.find(entity)] = entity
-		sentence = sentence.replace(entity, PH_MARK, 1)
-
-	for lquote in re.findall(rf"({QUOTE_PATTERN})\b", sentence):
-		positions[sentence.find(lquote)] = lquote + '\b'
-		sentence = sentence.replace(lquote, PH_MARK, 1)
-
-	for rquote in re.findall(rf"\b({QUOTE_PATTERN})", sentence):
-		positions[sentence.find(rquote)] = '\b' + rquote
-		sentence = sentence.replace(rquote, PH_MARK, 1)
-
-	return sentence, [positions[pos] for pos in sorted(positions.keys())]
-
-def remove_markers(sentence, maps):
-	sentence = sentence.replace(' '.join(list(PH_MARK)), PH_MARK)
-	for map in maps:
-		if map[0] == '\b':
-			sentence = sentence.replace(' ' + PH_MARK, map[1], 1)
-		elif len(map) > 1 and map[1] == '\b':
-			sentence = sentence.replace(PH_MARK + ' ', map[0], 1)
-		else:
-			sentence = sentence.replace(PH_MARK, map, 1)
-	return sentence
-
-teststring = 'Abo sće hižo raz wo wužiwanju „dźěćacych pytanskich mašinow“ kaž blinde-kuh.de a fragFINN.de pod sylko.freudenberg@stadt.kamenz.de přemyslował/a?'
-try:
-	assert \
-		set_markers(teststring) \
-		== \
-		('Abo sće hižo raz wo wužiwanju ⟦⟧dźěćacych pytanskich mašinow⟦⟧ kaž ⟦⟧ a ⟦⟧ pod ⟦⟧ přemyslował/a?', ['„\b', '\b“', 'blinde-kuh.de', 'fragFINN.de', 'sylko.freudenberg@stadt.kamenz.de'])
-
-except AssertionError as e:
-	eprint('Platzhalter passen nicht!')
-	eprint(set_markers(teststring))
-	sys.exit(1)
-
 import ctranslate2, logging
 ctranslate2.set_log_level(logging.INFO)
 #('off', 'critical', 'error', 'warning (default)', 'info', 'debug', 'trace')
@@ -93,7 +18,7 @@ import youtokentome as yttm
 
 # in version.txt kann man nach Belieben eine Versionsnummer nach dem Muster des Beschreibungs-Dokuments setzen.
 # Die letzte(n) Stelle(n) der Versionsnummer und das Datum pflegen sich automatisch
-webservice_version = set_version('version.txt')
+webservice_version = set_version('version.txt', __file__)
 modelpath = 'models'
 model_config_file = 'model_config.yaml'
 
@@ -133,22 +58,33 @@ class model:
 			while i < len(text) and text[i] != ' ':
 				i += 1
 
+	def translate_sentences(self, sentences, src, tgt):
+		"""
+		Übersetzt alle Sätze eines Dokuments mit einem BPE-Aufruf und einem translate_batch-Aufruf.
+		Wegen MKL_CBWR ist das Ergebnis identisch zur Übersetzung der einzelnen Sätze.
+		Gibt die Übersetzungen und die Menge der Wörter aus Eingabe und Übersetzung zurück.
+		"""
+		if not sentences: return [], set()
+		fakeperiods = [bool(sentence) and not (sentence[-1] in string.punctuation + '…') for sentence in sentences]
+		sentences = [sentence + '.' if fakeperiod else sentence for sentence, fakeperiod in zip(sentences, fakeperiods)]
+		if self.ext: sentences, maps = zip(*mark(sentences))
+		tok_sentences = pipeline.tokenize(sentences, self.tokenizers[src].tokenize)
+		vocabs = set()
+		for tok_sentence in tok_sentences:
+			vocabs.update(get_words(tok_sentence))
+		bpe_sentences = bpe.encode(tok_sentences, self.bpe)
+		results = pipeline.translate([[f"<{tgt}>"] + bpe_sentence for bpe_sentence in bpe_sentences], self.translator, replace_unknowns=False, return_scores=False) # repetition_penalty=2
+		tok_translations = bpe.decode([result.hypotheses[0] for result in results])
+		for tok_translation in tok_translations:
+			vocabs.update(get_words(tok_translation))
+		translations = pipeline.detokenize(tok_translations, self.tokenizers[tgt].detokenize)
+		if self.ext: translations = unmark(translations, maps)
+		translations = [strip_markers(translation[:-1] if fakeperiod else translation) for translation, fakeperiod in zip(translations, fakeperiods)]
+		return translations, vocabs
+
 	def s_translate(self, sentence, src, tgt):
-		fakeperiod = sentence and not (sentence[-1] in string.punctuation + '…')
-		if fakeperiod: sentence += '.'
-		if self.ext: sentence, maps = set_markers(sentence)
-		tok_sentence = self.tokenizers[src].tokenize(sentence)
-		# tok_sentence = ' '.join(tok_sentence).replace(' '.join(list(PH_MARK)), PH_MARK).split()
-		vocabs = get_words(tok_sentence)
-		tok_sentence = [f"<{tgt}>"] + self.bpe.encode([' '.join(tok_sentence)], output_type=yttm.OutputType.SUBWORD)[0]
-		results = self.translator.translate_batch([tok_sentence], replace_unknowns=False, return_scores=False) # repetition_penalty=2
-		# eprint(results[0].scores[0])
-		tok_translation = bpe_detokenize(results[0].hypotheses[0])
-		vocabs.update(get_words(tok_translation))
-		translation = self.tokenizers[tgt].detokenize(tok_translation)
-		if self.ext: translation = remove_markers(translation, maps)
-		if fakeperiod: translation = translation[:-1]
-		return translation.translate(str.maketrans('', '', PH_MARK)), vocabs
+		translations, vocabs = self.translate_sentences([sentence], src, tgt)
+		return translations[0], vocabs
 
 models, gui_models = {}, {}
 for direction, locations in model_config.items():
@@ -163,20 +99,6 @@ modelnames = set(models.keys())
 # Sind alle Modelle vorhanden und konfiguriert?
 assert set(model.location for model in models.values()) == set(os.listdir(modelpath)) - {model_config_file}
 
-def bpe_detokenize(tokens):
-	return ''.join(tokens).replace('▁', ' ').strip().split()
-
-def prepareTranslationInputText(text):
-	text = text.translate(str.maketrans(' ', ' ', '\u00AD\u200B\r')) # SOFT HYPHEN (U+00AD); ZERO WIDTH SPACE (U+200B); \r verwirrt bisweilen die Übersetzer ...
-	text = re.sub(r"[ \t]+", " ", text)
-	for f, r in ('Ä','Ä'), ('Ö','Ö'), ('Ü','Ü'), ('ä','ä'), ('ö','ö'), ('ü','ü'), ('ﬀ','ff'), ('ﬁ','fi'), ('ﬂ','fl'), ('ﬅ','ft'):
-		if f in text:
-			text = text.replace(f, r)
-	return text.replace(" \n", "\n")
-
-def get_words(tokens):
-	return set(token.translate(str.maketrans('', '', '.')) for token in tokens if not token.isnumeric())
-
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 
@@ -220,15 +142,12 @@ def translate_text():
 		if not type(debug) is bool : return { "errormsg": f"'debug': you specified {debug} ({type(debug)}) but 'debug' should be true or false" }
 		if debug: return { "errormsg": "content for option 'debug' not specified => no operation so far" }
 
-	input = [list(model.s_split(src, line)) if len(line) else [] for line in prepareTranslationInputText(text).rstrip().split('\n')]
+	input = [list(model.s_split(src, line)) if len(line) else [] for line in normalize([text])[0].rstrip().split('\n')]
 
-	output, vocabs = [], set()
-	for line in input:
-		items = []
-		if line:
-			for sentence in line:
-				(lambda x, y: (items.append(x), vocabs.update(y))) (*model.s_translate(sentence, src, tgt))
-		output.append(items)
+	# alle Sätze des Dokuments in einem Batch übersetzen und danach wieder auf die Zeilen verteilen
+	translations, vocabs = model.translate_sentences([sentence for line in input for sentence in line], src, tgt)
+	translations = iter(translations)
+	output = [[next(translations) for sentence in line] for line in input]
 
 	return {
 		"marked_input": input,
@@ -237,6 +156,11 @@ def translate_text():
 		"unks": list(vocabs-model.vocabs) if model.ext else []
 	}
 
+@app.route('/status', methods=['GET'])
+def status():
+	# Aufrufe und Zeiten der Pipeline-Schritte
+	return { "pipeline": pipeline.status() }
+
 @app.route('/info', methods=['GET'])
 def info():
 	output = "name", "directions", "traindate", "BLEU_score"
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+# Vergleicht die Übersetzung Satz für Satz (model.s_translate, wie früher im /translate-Endpunkt)
+# mit der Übersetzung des ganzen Dokuments in einem Batch (model.translate_sentences).
+# Aufruf im Container (bzw. im Verzeichnis mit models/ und version.txt):
+#   python benchmark.py --text dokument.txt [--models 2024-08-09_de2hsb ...]
+# dokument.txt wird wie beim /translate-Aufruf in Sätze zerlegt; übersetzt wird mit jedem Modell aus der
+# Quellsprache seiner ersten Richtung.
+
+import argparse, time
+
+import CTranslator
+from pipeline.normalization import prepareTranslationInputText
+
+
+def split_sentences(m, src, text):
+	lines = prepareTranslationInputText(text).rstrip().split('\n')
+	return [sentence for line in lines if len(line) for sentence in m.s_split(src, line)]
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--text', required=True, help='document to translate')
+	parser.add_argument('--models', nargs='+', help='model directories in models/ (default: all)')
+	args = parser.parse_args()
+
+	text = open(args.text, encoding='utf-8').read()
+	selected = [m for m in CTranslator.models.values() if not args.models or m.location in args.models]
+
+	print(f"{'model':<32}{'direction':<10}{'sentences':>10}{'single s':>10}{'batch s':>10}{'speedup':>9}  identical")
+	for m in selected:
+		direction = m.directions[0]
+		src, tgt = direction.split('_')
+		sentences = split_sentences(m, src, text)
+
+		start = time.perf_counter()
+		single = [m.s_translate(sentence, src, tgt)[0] for sentence in sentences]
+		single_seconds = time.perf_counter() - start
+
+		start = time.perf_counter()
+		batch, _ = m.translate_sentences(sentences, src, tgt)
+		batch_seconds = time.perf_counter() - start
+
+		print(f"{m.location:<32}{direction:<10}{len(sentences):>10}{single_seconds:>10.2f}{batch_seconds:>10.2f}{single_seconds/batch_seconds:>9.2f}  {single == batch}")
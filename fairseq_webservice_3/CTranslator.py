@@ -2,27 +2,27 @@
 
 import os, sys, string
 from ruamel.yaml import YAML
-from collections import defaultdict
 from sentence_splitter import SentenceSplitter
 import re
 import unicodedata
+import threading, time, hashlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 
+import placeholder_handling
 from placeholder_handling import set_markers, unset_markers
+import vocabulary_index
+import protected_patterns
+import pipeline
+from pipeline import bpe, profiler, set_version
+from pipeline.normalization import normalize, add_words
+from pipeline.admission import admission_control, rejected
+from translation_memory import translation_memory
+from decoder_cache import decoder_cache, cache_key
 
 os.environ["MKL_CBWR"] = "AUTO,STRICT" # Batchtranslations sollen nicht von der Übersetzung einzelner Sätze abweichen
 
 
-def set_version(vstore):
-	import datetime
-	version = open(vstore, 'r').readline()
-	v_num, v_date = version.split()
-	f_date = str(datetime.datetime.fromtimestamp(os.stat(__file__).st_mtime)).split()[0]
-	if not v_date == f_date:
-		major, minor = v_num.rsplit('.', 1)
-		version = f'{major}.{int(minor) + 1} {f_date}'
-		with open(vstore, 'w') as f: f.write(version)
-	return version
-
 # Comment added to trigger version update
 
 import ctranslate2, logging
@@ -34,28 +34,130 @@ import youtokentome as yttm
 
 # in version.txt kann man nach Belieben eine Versionsnummer nach dem Muster des Beschreibungs-Dokuments setzen.
 # Die letzte(n) Stelle(n) der Versionsnummer und das Datum pflegen sich automatisch
-webservice_version = set_version('version.txt')
+webservice_version = set_version('version.txt', __file__)
 modelpath = 'models'
 model_config_file = 'model_config.yaml'
 
-# model_config.yaml listet pro gültiger Übersetzungsrichtung auf, in welchen Verzeichnissen Modelle für diese Richtung einsetzbar sind
-# Der erste Eintrag ist das default-Modell, welches zum Einsatz kommt, wenn bei der Übersetzungsanfrage kein Modell spezifiziert wurde
-# Editierende von model_config.yaml sind für sinnvolle und gültige Einträge verantwortlich!
-model_config = YAML().load(open(f'{modelpath}/{model_config_file}'))
-valid_directions = set(model_config.keys())
-valid_sources, valid_targets = map(set, zip(*(dir.split('_') for dir in valid_directions)))
-
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rechengenauigkeiten, die per compute_type in model_info.yaml gewählt werden dürfen ('default' = wie konvertiert)
+valid_compute_types = {'default', 'int8', 'int8_float32', 'int16', 'float32'}
+
+# Decoding-Profile: Parameter für translate_batch, pro Modell in model_info.yaml (decoding_profiles) überschreib- und erweiterbar.
+# max_length_ratio/max_length_offset begrenzen die Ausgabelänge relativ zur (BPE-kodierten) Eingabe, damit ein
+# halluzinierendes Modell nicht bis max_decoding_length weiterläuft; höher als max_decoding_length (Default wie in
+# CTranslate2: 256) wird die Grenze nie.
+default_decoding_profiles = {
+	'default': {'beam_size': 2, 'max_length_ratio': 3, 'max_length_offset': 10},
+	'fast': {'beam_size': 1, 'max_length_ratio': 1.5, 'max_length_offset': 5},
+	'quality': {'beam_size': 5, 'max_length_ratio': 3, 'max_length_offset': 10},
+}
+valid_decoding_options = {
+	'beam_size', 'patience', 'length_penalty', 'coverage_penalty', 'repetition_penalty', 'no_repeat_ngram_size',
+	'max_input_length', 'max_decoding_length', 'min_decoding_length', 'max_length_ratio', 'max_length_offset',
+}
+default_max_decoding_length = 256
+
+def length_groups(sentences, factor=2):
+	"""Indizes der Sätze, nach Länge sortiert und in Gruppen, in denen kein Satz mehr als factor-mal so lang ist wie der kürzeste."""
+	groups = []
+	for i in sorted(range(len(sentences)), key=lambda i: len(sentences[i])):
+		if groups and len(sentences[i]) <= factor * len(sentences[groups[-1][0]]): groups[-1].append(i)
+		else: groups.append([i])
+	return groups
+
+# Kernzuordnung (cpu_cores in model_info.yaml): Liste von Kernen, cpulist wie "0-7,16-23" oder "node:1" (alle Kerne des NUMA-Knotens 1)
+def parse_cpu_cores(spec):
+	if isinstance(spec, int): return {spec}
+	if not isinstance(spec, str): return set(spec)
+	if spec.startswith('node:'):
+		with open(f'/sys/devices/system/node/node{int(spec[5:])}/cpulist') as f: spec = f.read().strip()
+	cores = set()
+	for part in spec.split(','):
+		first, _, last = part.strip().partition('-')
+		cores.update(range(int(first), int(last or first) + 1))
+	return cores
+
+def format_cpu_cores(cores):
+	# {0,1,2,3,8} -> "0-3,8"
+	ranges = []
+	for core in sorted(cores):
+		if ranges and ranges[-1][1] == core - 1: ranges[-1][1] = core
+		else: ranges.append([core, core])
+	return ','.join(f'{first}-{last}' if last > first else f'{first}' for first, last in ranges)
+
+@contextmanager
+def cpu_affinity(cores):
+	# Threads erben die Kernzuordnung des Threads, der sie startet; sched_setaffinity(0, ...) betrifft nur den aktuellen Thread
+	if not cores:
+		yield
+		return
+	previous = os.sched_getaffinity(0)
+	os.sched_setaffinity(0, cores)
+	try:
+		yield
+	finally:
+		os.sched_setaffinity(0, previous)
+
+class sentence_record:
+	"""
+	Ein Satz auf seinem Weg durch die Pipeline. Ersetzt die parallelen Tupel, die pro Satz erzeugten sets und die
+	dicts für die Marker-Information; tokens und markers werden nach der Nachbearbeitung wieder freigegeben.
+	alternatives (alle Hypothesen, die erste = translation) und scores werden nur auf Anfrage (num_hypotheses, scores) gesetzt.
+	"""
+	__slots__ = ('text', 'line', 'tokens', 'prefix', 'fakeperiod', 'markers', 'translation', 'alternatives', 'scores')
+
+	def __init__(self, text, line=0):
+		self.text = text
+		self.line = line
+		self.tokens = None
+		self.prefix = None
+		self.fakeperiod = False
+		self.markers = None
+		self.translation = None
+		self.alternatives = None
+		self.scores = None
+
+
 class model:
-	def __init__(self, location, default=False):
+	def __init__(self, location, default=False, compute_type=None, placement=True):
 		path = modelpath + '/' + location
+		# Ladezeiten der einzelnen Bestandteile, für den Startup-Report unter /ready
+		self.load_times = dict()
+		start = time.perf_counter()
 		model_info = YAML().load(open(path + '/model_info.yaml'))
 		self.location = location
 		self.default = default
-		self.translator = ctranslate2.Translator(path, device="cpu")
+
+		# compute_type kann (z.B. für Benchmarks) beim Erzeugen überschrieben werden
+		self.compute_type = compute_type or model_info.get('compute_type', 'default')
+		if not self.compute_type in valid_compute_types:
+			raise ValueError(f"{location}: compute_type {self.compute_type} is not one of {sorted(valid_compute_types)}")
+		if not self.compute_type == 'default' and not self.compute_type in ctranslate2.get_supported_compute_types("cpu"):
+			raise ValueError(f"{location}: compute_type {self.compute_type} is not supported on this CPU")
+		# optional: für einen compute_type separat konvertierte Gewichte in einem Unterordner des Modells
+		converted_weights = model_info.get('converted_weights', dict())
+		self.weights = converted_weights.get(self.compute_type)
+		# optional: Kerne und Threads des Übersetzers; placement=False ignoriert sie (für Benchmarks).
+		# Die Worker-Threads von CTranslate2 und ihre OpenMP-Threads entstehen beim Erzeugen des Translators und bleiben auf
+		# cpu_cores; die Gewichte werden dabei von diesen Kernen aus geladen und liegen so im Speicher ihres NUMA-Knotens.
+		self.cpu_cores = parse_cpu_cores(model_info['cpu_cores']) if placement and model_info.get('cpu_cores') is not None else None
+		if self.cpu_cores is not None and not (self.cpu_cores and self.cpu_cores <= os.sched_getaffinity(0)):
+			raise ValueError(f"{location}: cpu_cores {model_info['cpu_cores']} are not available to this process")
+		self.inter_threads = model_info.get('inter_threads', 1) if placement else 1
+		self.intra_threads = model_info.get('intra_threads', max(1, len(self.cpu_cores) // self.inter_threads) if self.cpu_cores else 0) if placement else 0
+		with cpu_affinity(self.cpu_cores):
+			self.translator = ctranslate2.Translator(path + '/' + self.weights if self.weights else path, device="cpu", compute_type=self.compute_type,
+													 inter_threads=self.inter_threads, intra_threads=self.intra_threads)
+		self.compute_type = self.translator.compute_type # tatsächlich aktive Rechengenauigkeit (für /info)
+		self.load_times['translator'] = time.perf_counter() - start
+		start = time.perf_counter()
 		self.bpe = yttm.BPE(model = path + '/codes-yttm')
+		# Pivot-Übersetzungen geben die BPE-Tokens direkt weiter, wenn beide Modelle dieselben BPE-Codes haben
+		with open(path + '/codes-yttm', 'rb') as f:
+			self.bpe_digest = hashlib.sha256(f.read()).hexdigest()
+		self.load_times['bpe'] = time.perf_counter() - start
 		self.name = model_info.get('name')
 		self.directions = model_info.get('directions')
 		self.trainer = model_info.get('trainer')
@@ -63,21 +165,29 @@ class model:
 		self.return_unks = model_info.get('return_unks')
 		self.BLEU_score = model_info.get('BLEU_score')
 		self.TER_score = model_info.get('TER_score')
+		# Version des Modells für decoder_cache und translation_memory: Inhalt von model_info.yaml (traindate, ...) und Größen
+		# der Modelldateien (auch in converted_weights/); anders als model_fingerprint gleich in allen Containern
+		with open(path + '/model_info.yaml', 'rb') as f:
+			digest = hashlib.sha256(f.read())
+		digest.update(repr([(name, stat.st_size) for name, stat in model_files(path)]).encode('utf-8'))
+		self.version = digest.hexdigest()
 
-		if self.return_unks: self.vocabs = set(open(path + '/train_vocabulary.txt').read().split('\n'))
+		start = time.perf_counter()
+		if self.return_unks: self.vocabs = vocabulary_index.load(path + '/train_vocabulary.txt')
+		self.load_times['vocabulary'] = time.perf_counter() - start
 
 		self.aggressive_dash_splits = model_info.get('aggressive_dash_splits')
 		self.escape_xml = model_info.get('escape_xml')
 		self.tokenizer_languages = model_info.get('tokenizer_languages')
+		# Achtung: die Modelle in models/ geben protected_pattern_file an, gelesen wird aber protected_pattern_filepath; ihre
+		# Muster sind also nicht aktiv. Das zu ändern, ändert Tokenisierung und Übersetzungen (z.B. bleibt ⟦…⟧ ein Token).
 		protected_pattern_filepath = model_info.get('protected_pattern_filepath')
-		if protected_pattern_filepath:
-			with open(os.path.join("/app", protected_pattern_filepath)) as protected_pattern_file:
-				self.protected_patterns = [line.strip() for line in protected_pattern_file.readlines()]
-		else:
-			self.protected_patterns = None
+		# einmal kompiliert und von allen Modellen geteilt
+		self.protected_patterns = protected_patterns.load(os.path.join("/app", protected_pattern_filepath)) if protected_pattern_filepath else None
 		self.ne_placeholder_separator = model_info.get("ne_placeholder_separator", "┿")
 
 
+		start = time.perf_counter()
 		self.custom_nonbreaking_prefix_files = model_info.get("custom_nonbreaking_prefix_files", dict())
 		self.sentence_splitter_nonbreaking_prefix_files = model_info.get('sentence_splitter_nonbreaking_prefix_files', dict())
 
@@ -100,57 +210,219 @@ class model:
 													 non_breaking_prefix_file=prefix_file)
 			else:
 				self.sentence_splitters[lang] = SentenceSplitter(language=lang)
+		self.load_times['tokenizers'] = time.perf_counter() - start
 		
 		self.placeholder_method = model_info.get("placeholder_handling_method")
 		self.replace_unknowns = model_info.get("replace_unknowns", False)
 
+		self.decoding_profiles = {name: dict(profile) for name, profile in default_decoding_profiles.items()}
+		for name, profile in model_info.get('decoding_profiles', dict()).items():
+			self.decoding_profiles.setdefault(name, dict()).update(profile)
+		for name, profile in self.decoding_profiles.items():
+			wrong_options = set(profile.keys()) - valid_decoding_options
+			if wrong_options: raise ValueError(f"{location}: decoding profile {name} has invalid options {' '.join(wrong_options)}")
+		self.default_decoding_profile = model_info.get('default_decoding_profile', 'default')
+		if not self.default_decoding_profile in self.decoding_profiles:
+			raise ValueError(f"{location}: default_decoding_profile {self.default_decoding_profile} is not defined")
+
+	def placement(self):
+		# für /info; intra_threads 0 = Default von CTranslate2
+		return { "cpu_cores": format_cpu_cores(self.cpu_cores) if self.cpu_cores else None, "inter_threads": self.inter_threads, "intra_threads": self.intra_threads }
+
+	def s_split_offsets(self, lang, text):
+		"""(start, end)-Offsets der Sätze in text"""
+		text_replace_special_chars = text.translate(splitter_quote_table)
+		return sentence_offsets(text_replace_special_chars, self.sentence_splitters[lang].split(text_replace_special_chars))
+
 	def s_split(self, lang, text):
-		text_replace_special_chars = text.translate(str.maketrans('„“»«‚‘', '""""""'))
-		splitted = self.sentence_splitters[lang].split(text_replace_special_chars)
-		i = 0
-		for sentence in splitted:
-			yield text[i : i + len(sentence) + 1].strip()
-			i += len(sentence)
-			while i < len(text) and text[i] != ' ':
-				i += 1
+		for start, end in self.s_split_offsets(lang, text):
+			yield text[start:end]
 
-	def _preprocess_sentence(self, sentence, src, tgt):
+	def _preprocess_sentence(self, record, src, tgt, vocabs):
+		sentence = record.text
 		logger.info(f"Input sentence: {sentence}")
 		#fakeperiod = sentence and not (sentence[-1] in string.punctuation + '…')
-		fakeperiod = sentence and not unicodedata.category(sentence[-1]).startswith("P")
+		fakeperiod = bool(sentence) and not unicodedata.category(sentence[-1]).startswith("P")
 		if fakeperiod: sentence += '.'
-		sentence, markers_information = set_markers(sentence, self.placeholder_method, self.ne_placeholder_separator)
+		with pipeline.timed('set_markers'):
+			sentence, markers = set_markers(sentence, self.placeholder_method, self.ne_placeholder_separator)
 		sentence = re.sub(r'\.(?=\w)', '. ', sentence)
 		logger.info(f"marked sentence: {sentence}")
-		logger.info(f"marker info: {markers_information}")
-		tok_sentence = self.tokenizers[src].tokenize(sentence,
-											    aggressive_dash_splits=self.aggressive_dash_splits,
-												protected_patterns=self.protected_patterns,
-												escape=self.escape_xml,
-												return_str=False
-											   )
+		logger.info(f"marker info: {markers}")
+		with pipeline.timed('tokenize'):
+			if self.protected_patterns:
+				tok_sentence = self.protected_patterns.tokenize(self.tokenizers[src], sentence,
+																aggressive_dash_splits=self.aggressive_dash_splits,
+																escape=self.escape_xml)
+			else:
+				tok_sentence = self.tokenizers[src].tokenize(sentence,
+														    aggressive_dash_splits=self.aggressive_dash_splits,
+															escape=self.escape_xml,
+															return_str=False
+														   )
 		logger.info(f"tokenized sentence: {tok_sentence}")
-		vocabs = get_words(tok_sentence)
-		tok_sentence = [f"<{tgt}>"] + self.bpe.encode([' '.join(tok_sentence)], output_type=yttm.OutputType.SUBWORD)[0]
-		logger.info(f"Preprocessed sentence: {tok_sentence}")
-		return tok_sentence, vocabs, fakeperiod, markers_information
+		pipeline.count('source_tokens', len(tok_sentence))
+		add_words(vocabs, tok_sentence)
+		# BPE für alle Sätze eines Batches in translate_records
+		record.tokens, record.fakeperiod, record.markers = tok_sentence, fakeperiod, markers
 
 
-	def _postprocess_sentence(self, result, tgt, fakeperiod, markers_information):
-		logger.info(f"model result: {result}")
-		tok_translation = bpe_detokenize(result.hypotheses[0])
-		logger.info(f"BPE-Detokenized sentence: {tok_translation}")
-		vocabs = get_words(tok_translation)
+	def _postprocess_translation(self, record, tok_translation, tgt, placeholders=None):
+		# placeholders: Modell, das die Marker gesetzt hat (bei Pivot-Übersetzungen das erste), sonst dieses
+		placeholders = placeholders or self
 		logger.info(f"BPE-Detokenized sentence: {tok_translation}")
-		translation = self.detokenizers[tgt].detokenize(tok_translation)
+		with pipeline.timed('detokenize'):
+			translation = self.detokenizers[tgt].detokenize(tok_translation)
 		logger.info(f"Detokenized sentence: {translation}")
-		translation = unset_markers(translation, self.placeholder_method, markers_information, self.ne_placeholder_separator)
-		if fakeperiod: translation = translation[:-1]
+		with pipeline.timed('unset_markers'):
+			translation = unset_markers(translation, placeholders.placeholder_method, record.markers, placeholders.ne_placeholder_separator)
+		if record.fakeperiod: translation = translation[:-1]
 		logger.info(f"Postprocessed sentence: {translation}")
-		return translation, vocabs
+		return translation
+
+
+	def _postprocess_sentence(self, record, tok_translations, tgt, vocabs, placeholders=None):
+		# tok_translations: alle Hypothesen des Satzes; jede bekommt die Marker des Satzes zurück
+		translations = [self._postprocess_translation(record, tok_translation, tgt, placeholders) for tok_translation in tok_translations]
+		# für die Vokabularprüfung (unks) zählt nur die Übersetzung, die zurückgegeben wird
+		add_words(vocabs, tok_translations[0])
+		pipeline.count('target_tokens', len(tok_translations[0]))
+		record.translation = translations[0]
+		if len(translations) > 1: record.alternatives = translations
+		record.tokens = record.prefix = record.markers = None
+
+
+	def _target_prefix(self, found, tgt):
+		# Hinweis aus der Translation Memory: ganze Übersetzung (tm_hint 'bias') oder ihr geschätzter gemeinsamer Anfang ('prefix')
+		words = found.translation.split()
+		if tm_hint == 'prefix': words = words[:found.prefix_words]
+		if not words: return None
+		tok_prefix = self.tokenizers[tgt].tokenize(' '.join(words), aggressive_dash_splits=self.aggressive_dash_splits,
+												   escape=self.escape_xml, return_str=False)
+		return bpe.encode([tok_prefix], self.bpe)[0]
+
+
+	def _decode(self, tok_sentences, profile, prefixes=None, num_hypotheses=1, return_scores=False):
+		options = dict(self.decoding_profiles[profile or self.default_decoding_profile])
+		if num_hypotheses > 1:
+			# CTranslate2 liefert höchstens beam_size Hypothesen (Default beam_size: 2)
+			options['num_hypotheses'] = num_hypotheses
+			options['beam_size'] = max(options.get('beam_size', 2), num_hypotheses)
+		max_length_ratio = options.pop('max_length_ratio', None)
+		max_length_offset = options.pop('max_length_offset', 0)
+		max_decoding_length = options.pop('max_decoding_length', default_max_decoding_length)
+		if not (prefixes and any(prefixes)): prefixes = None
+		elif tm_hint == 'bias': options['prefix_bias_beta'] = tm_prefix_bias
+		logger.info(f"decoding options: {options}")
+		pipeline.count('bpe_tokens', sum(map(len, tok_sentences)))
+		# Die Längengrenze gilt pro Aufruf von translate_batch. Damit sie auch für kurze Sätze neben langen greift, werden die
+		# Sätze in Gruppen ähnlicher Länge übersetzt (bei gemischten Dokumenten wenige Aufrufe statt einem).
+		groups = length_groups(tok_sentences) if max_length_ratio is not None else [range(len(tok_sentences))]
+		results = [None] * len(tok_sentences)
+		for group in groups:
+			batch = [tok_sentences[i] for i in group]
+			max_length = max_decoding_length
+			if max_length_ratio is not None:
+				max_length = min(int(max(map(len, batch)) * max_length_ratio) + max_length_offset, max_decoding_length)
+			if prefixes: options['target_prefix'] = [prefixes[i] for i in group]
+			for i, result in zip(group, pipeline.translate(batch, self.translator, replace_unknowns=self.replace_unknowns, return_scores=return_scores,
+														   max_decoding_length=max_length, **options)):
+				results[i] = result
+		return results
+
+
+	def _encode_records(self, records, tgt):
+		# BPE für alle Sätze in einem Aufruf, mit dem Tag der Zielsprache
+		for record, tok_sentence in zip(records, bpe.encode([record.tokens for record in records], self.bpe)):
+			record.tokens = [f"<{tgt}>"] + tok_sentence
+			logger.info(f"Preprocessed sentence: {record.tokens}")
+
+
+	def _decode_records(self, records, profile, cache=None, num_hypotheses=1, return_scores=False):
+		"""Übersetzt record.tokens (BPE); gibt pro Satz die Liste seiner Hypothesen zurück, aus dem Cache immer genau eine."""
+		# Sätze mit target_prefix hängen vom Hinweis ab und werden nicht gecacht
+		keys = [cache_key(self.name, self.version, profile or self.default_decoding_profile, record.tokens) if cache is not None and record.prefix is None else None
+				for record in records]
+		# der Cache ist nur eine Abkürzung: schlägt er fehl (Datei gesperrt, Platte voll, ...), wird normal übersetzt
+		with pipeline.timed('decoder_cache'):
+			try:
+				cached = cache.get([key for key in keys if key is not None]) if cache is not None else dict()
+			except Exception:
+				logger.exception("decoder cache lookup failed, decoding all sentences")
+				cached = dict()
+		hypotheses = [[cached[key]] if key in cached else None for key in keys]
+		missing = [i for i, hypothesis in enumerate(hypotheses) if hypothesis is None]
+		if missing:
+			results = self._decode([records[i].tokens for i in missing], profile, [records[i].prefix for i in missing], num_hypotheses, return_scores)
+			for i, result in zip(missing, results):
+				hypotheses[i] = result.hypotheses[:num_hypotheses]
+				if return_scores: records[i].scores = result.scores[:num_hypotheses]
+			if cache is not None:
+				try:
+					cache.put(self.name, [(keys[i], hypotheses[i][0]) for i in missing if keys[i] is not None])
+				except Exception:
+					logger.exception("storing in the decoder cache failed")
+		logger.info(f"model results: {hypotheses}")
+		return hypotheses
+
+
+	def _postprocess_records(self, records, hypotheses, tgt, vocabs, placeholders=None):
+		# alle Hypothesen aller Sätze in einem Aufruf BPE-dekodieren
+		tok_translations = iter(bpe.decode([hypothesis for sentence in hypotheses for hypothesis in sentence]))
+		for record, sentence in zip(records, hypotheses):
+			self._postprocess_sentence(record, [next(tok_translations) for _ in sentence], tgt, vocabs, placeholders)
+
+
+	def translate_records(self, records, src, tgt, profile=None, vocabs=None, memory=None, cache=None, num_hypotheses=1, return_scores=False):
+		"""
+		Process and translate sentence records in one batch; sets record.translation.
+		With a translation memory, exact matches are not decoded and new translations are added to the memory.
+		With a decoder cache, cached hypotheses for the preprocessed sentences are not decoded again.
+		With num_hypotheses > 1 or return_scores, record.alternatives and record.scores are set for decoded sentences;
+		the decoder cache (which holds only the best hypothesis) is not used then.
 
+		Args:
+			records ([sentence_record]): Sentences to translate.
+			src (str): Source language.
+			tgt (str): Target language.
+			profile (str): Name of the decoding profile; None for the model's default profile.
+			vocabs ({str}): Set to which the words of the sentences and the translations are added.
+			memory (translation_memory): Translation memory, or None.
+			cache (decoder_cache): Decoder cache, or None.
+			num_hypotheses (int): Number of hypotheses per sentence.
+			return_scores (bool): Set record.scores (score of each hypothesis).
 
-	def translate_sentences(self, sentences, src, tgt):
+		Returns:
+			vocabs ({str}): Set of words used in the sentences and the translations.
+		"""
+		if vocabs is None: vocabs = set()
+		if num_hypotheses > 1 or return_scores: cache = None
+		# Einträge gelten pro Modell und Decoding-Profil
+		tm_model, direction = f'{self.name}/{profile or self.default_decoding_profile}', f'{src}_{tgt}'
+		with pipeline.timed('translation_memory'):
+			matches = memory.lookup(tm_model, self.version, direction, [record.text for record in records]) if memory is not None else [None] * len(records)
+		todo = []
+		for record, found in zip(records, matches):
+			self._preprocess_sentence(record, src, tgt, vocabs)
+			if found is not None and found.exact:
+				record.translation = found.translation
+				add_words(vocabs, self.tokenizers[tgt].tokenize(found.translation, escape=self.escape_xml, return_str=False))
+				record.tokens = record.markers = None
+				continue
+			# mit Platzhaltern im Satz passt die gespeicherte Übersetzung (mit Originaltexten) nicht zur Eingabe des Decoders
+			if found is not None and tm_hint and not record.markers:
+				record.prefix = self._target_prefix(found, tgt)
+			todo.append(record)
+		if todo:
+			self._encode_records(todo, tgt)
+			hypotheses = self._decode_records(todo, profile, cache, num_hypotheses, return_scores)
+			self._postprocess_records(todo, hypotheses, tgt, vocabs)
+			if memory is not None:
+				memory.add(tm_model, self.version, direction, [(record.text, record.translation) for record in todo])
+		return vocabs
+
+
+	def translate_sentences(self, sentences, src, tgt, profile=None):
 		"""
 		Process and translate a list of sentences.
 
@@ -158,58 +430,391 @@ class model:
 			sentences ([str]): List of sentences.
 			src (str): Source language.
 			tgt (str): Target language.
+			profile (str): Name of the decoding profile; None for the model's default profile.
 
 		Returns:
 			translations ([str]): List of translated sentences.
 			vocabs ({str}): Set of words used in the entences and the translations.
 		"""
+		records = [sentence_record(sentence) for sentence in sentences]
+		vocabs = self.translate_records(records, src, tgt, profile)
+		return [record.translation for record in records], vocabs
+
+
+class pivot:
+	"""
+	Übersetzung über eine Pivotsprache (z.B. cs → hsb → de) mit zwei Modellen, deklariert in model_config.yaml.
+
+	Beide Schritte laufen über dieselben Sätze im selben Batch. Das Zwischenergebnis wird nur so weit zurückverwandelt, wie
+	nötig: Tokenisieren beide Modelle die Pivotsprache gleich und verwenden dieselbe Platzhalter-Methode, bleibt es
+	tokenisiert (Marker und angehängter Punkt aus dem ersten Schritt bleiben erhalten), bei gleichen BPE-Codes sogar
+	BPE-kodiert. Sonst wird es wie eine Übersetzung nachbearbeitet und vom zweiten Modell neu vorverarbeitet.
+	Hat die Schnittstelle von model, soweit translate_document und /translate sie brauchen.
+	"""
+	def __init__(self, first, second, via):
+		self.first, self.second, self.via = first, second, via
+		self.name = f'{first.name}+{second.name}'
+		self.version = hashlib.sha256(f'{first.version}+{second.version}'.encode('utf-8')).hexdigest()
+		# Profile, die beide Modelle kennen; None wählt pro Modell dessen default_decoding_profile
+		self.decoding_profiles = {name: None for name in first.decoding_profiles if name in second.decoding_profiles}
+		self.default_decoding_profile = None
+		# unbekannte Wörter werden im Ausgangssatz (und im Zwischenergebnis) gesucht
+		self.return_unks = first.return_unks
+		self.vocabs = first.vocabs if first.return_unks else None
+
+		tokenization = lambda m: (m.tokenizer_languages[via], m.custom_nonbreaking_prefix_files.get(via), m.aggressive_dash_splits,
+								  m.escape_xml, m.protected_patterns, m.placeholder_method)
+		if tokenization(first) != tokenization(second): self.intermediate = 'text'
+		elif first.bpe_digest != second.bpe_digest: self.intermediate = 'tokens'
+		else: self.intermediate = 'bpe'
 
-		preprocessed_sentence_information = [self._preprocess_sentence(sentence, src, tgt) for sentence in sentences]
-		tok_sentences, sentences_vocabs, fakeperiod_info, sentences_markers_information = zip(*preprocessed_sentence_information)
-
-		vocabs = set()
-		for sentence_vocabs in sentences_vocabs:
-			vocabs.update(sentence_vocabs)
-		results = self.translator.translate_batch(tok_sentences, replace_unknowns=self.replace_unknowns, return_scores=False)
-		postprocess_arguments = zip(results, fakeperiod_info, sentences_markers_information)
-		processed_translation_information = [self._postprocess_sentence(result, tgt, fakeperiod, markers_information)
-									   for (result, fakeperiod, markers_information) in postprocess_arguments]
-		
-		translations, translations_vocabs = zip(*processed_translation_information)
-
-		for translation_vocabs in translations_vocabs:
-			vocabs.update(translation_vocabs)
-
-		return translations, vocabs
-
-
-models, gui_models = {}, {}
-for direction, locations in model_config.items():
-	for i, location in enumerate(locations):
-		print(location)
-		m = model(location, default = i==0)
-		models[m.name] = m
-		if i==0: gui_models[direction] = m.name
-del m
-
-modelnames = set(models.keys())
-
-# Sind alle Modelle vorhanden und konfiguriert?
-assert set(model.location for model in models.values()) == set(os.listdir(modelpath)) - {model_config_file}
-
-def bpe_detokenize(tokens):
-	return ''.join(tokens).replace('▁', ' ').strip().split()
-
-def prepareTranslationInputText(text):
-	text = text.translate(str.maketrans(' ', ' ', '\u00AD\u200B\r')) # SOFT HYPHEN (U+00AD); ZERO WIDTH SPACE (U+200B); \r verwirrt bisweilen die Übersetzer ...
-	text = re.sub(r"[ \t]+", " ", text)
-	for f, r in ('Ä','Ä'), ('Ö','Ö'), ('Ü','Ü'), ('ä','ä'), ('ö','ö'), ('ü','ü'), ('ﬀ','ff'), ('ﬁ','fi'), ('ﬂ','fl'), ('ﬅ','ft'):
-		if f in text:
-			text = text.replace(f, r)
-	return text.replace(" \n", "\n")
-
-def get_words(tokens):
-	return set(token.translate(str.maketrans('', '', '.')) for token in tokens if not token.isnumeric())
+	def s_split(self, lang, text):
+		return self.first.s_split(lang, text)
+
+	def translate_records(self, records, src, tgt, profile=None, vocabs=None, memory=None, cache=None, num_hypotheses=1, return_scores=False):
+		"""Wie model.translate_records, über die Pivotsprache; Hinweise aus der Translation Memory (TM_HINT) gibt es nicht."""
+		if vocabs is None: vocabs = set()
+		if num_hypotheses > 1 or return_scores: cache = None
+		tm_model, direction = f'{self.name}/{profile or "default"}', f'{src}_{tgt}'
+		with pipeline.timed('translation_memory'):
+			matches = memory.lookup(tm_model, self.version, direction, [record.text for record in records]) if memory is not None else [None] * len(records)
+		todo = []
+		for record, found in zip(records, matches):
+			self.first._preprocess_sentence(record, src, self.via, vocabs)
+			if found is not None and found.exact:
+				record.translation = found.translation
+				record.tokens = record.markers = None
+				continue
+			todo.append(record)
+		if todo:
+			self.first._encode_records(todo, self.via)
+			# der erste Schritt liefert nur die beste Hypothese; sie landet im Cache wie bei einer direkten Übersetzung
+			intermediate = self.first._decode_records(todo, profile, cache)
+			if self.intermediate == 'bpe':
+				for record, sentence in zip(todo, intermediate):
+					record.tokens = [f"<{tgt}>"] + sentence[0]
+			elif self.intermediate == 'tokens':
+				for record, tokens in zip(todo, bpe.decode([sentence[0] for sentence in intermediate])):
+					add_words(vocabs, tokens)
+					record.tokens = tokens
+				self.second._encode_records(todo, tgt)
+			else:
+				texts = [record.text for record in todo]
+				self.first._postprocess_records(todo, intermediate, self.via, vocabs)
+				for record in todo:
+					record.text = record.translation
+					self.second._preprocess_sentence(record, self.via, tgt, set())
+				for record, text in zip(todo, texts):
+					record.text = text
+				self.second._encode_records(todo, tgt)
+			hypotheses = self.second._decode_records(todo, profile, cache, num_hypotheses, return_scores)
+			# Wörter der Übersetzung gehören nicht zum Vokabular des ersten Modells
+			self.second._postprocess_records(todo, hypotheses, tgt, set(), self.first if self.intermediate != 'text' else None)
+			if memory is not None:
+				memory.add(tm_model, self.version, direction, [(record.text, record.translation) for record in todo])
+		return vocabs
+
+	def translate_sentences(self, sentences, src, tgt, profile=None):
+		records = [sentence_record(sentence) for sentence in sentences]
+		vocabs = self.translate_records(records, src, tgt, profile)
+		return [record.translation for record in records], vocabs
+
+
+# Der SentenceSplitter erkennt nur gerade Anführungszeichen; die Ersetzung ist 1:1, die Offsets bleiben also gültig
+splitter_quote_table = str.maketrans('„“»«‚‘', '""""""')
+
+def sentence_offsets(text, sentences):
+	"""
+	Bestimmt in einem Durchgang über text die (start, end)-Offsets der vom SentenceSplitter gelieferten Sätze.
+	Der SentenceSplitter entfernt Leerzeichen am Rand und fasst Leerzeichenfolgen zusammen; ansonsten sind die Sätze
+	Teilstrings von text.
+	"""
+	offsets = []
+	i = 0
+	for sentence in sentences:
+		while i < len(text) and text[i].isspace():
+			i += 1
+		start = i
+		if text.startswith(sentence, i):
+			offsets.append((start, i + len(sentence)))
+			i += len(sentence)
+			continue
+		for char in sentence:
+			if i < len(text) and text[i] == char:
+				i += 1
+				if char == ' ':
+					while i < len(text) and text[i] == ' ':
+						i += 1
+			else:
+				# sollte nicht vorkommen: den Satz so gut wie möglich abschätzen und beim nächsten Leerzeichen weitermachen
+				logger.warning(f"sentence {sentence!r} not found in {text!r}")
+				i = min(start + len(sentence), len(text))
+				while i < len(text) and text[i] != ' ':
+					i += 1
+				break
+		offsets.append((start, i))
+	return offsets
+
+def model_files(path):
+	# Alle Dateien des Modellordners mit Unterordnern (converted_weights/...), als (relativer Pfad, os.stat_result)
+	for root, dirs, files in os.walk(path):
+		dirs.sort()
+		for name in sorted(files):
+			filename = os.path.join(root, name)
+			yield os.path.relpath(filename, path), os.stat(filename)
+
+def model_fingerprint(location):
+	# Ändert sich, sobald eine Datei im Modellordner (model_info.yaml, model.bin, converted_weights/*/model.bin, ...)
+	# ersetzt oder geändert wird
+	path = modelpath + '/' + location
+	return tuple((name, stat.st_mtime_ns, stat.st_size) for name, stat in model_files(path))
+
+class model_registry:
+	"""
+	Alle Modelle einer Konfiguration aus model_config.yaml.
+
+	Ein Reload baut eine neue model_registry und tauscht sie als Ganzes aus (siehe reload_models);
+	laufende Anfragen arbeiten mit der model_registry weiter, die sie zu Beginn geholt haben.
+	"""
+	def __init__(self, previous=None):
+		# model_config.yaml listet pro gültiger Übersetzungsrichtung auf, in welchen Verzeichnissen Modelle für diese Richtung einsetzbar sind
+		# Der erste Eintrag ist das default-Modell, welches zum Einsatz kommt, wenn bei der Übersetzungsanfrage kein Modell spezifiziert wurde
+		# Editierende von model_config.yaml sind für sinnvolle und gültige Einträge verantwortlich!
+		# Statt einer Liste kann eine Richtung auch eine Pivotsprache haben (z.B. cs_de: {pivot: hsb}); übersetzt wird dann
+		# mit den default-Modellen der beiden Richtungen über die Pivotsprache (siehe pivot)
+		config = YAML().load(open(f'{modelpath}/{model_config_file}'))
+		self.pivot_config = {direction: entry['pivot'] for direction, entry in config.items() if isinstance(entry, dict)}
+		self.model_config = {direction: locations for direction, locations in config.items() if not direction in self.pivot_config}
+		self.valid_directions = set(config.keys())
+		self.valid_sources, self.valid_targets = map(set, zip(*(dir.split('_') for dir in self.valid_directions)))
+
+		locations = list(dict.fromkeys(location for locations in self.model_config.values() for location in locations))
+		defaults = set(locations[0] for locations in self.model_config.values())
+
+		# Sind alle Modelle vorhanden und konfiguriert?
+		if not set(locations) == set(os.listdir(modelpath)) - {model_config_file}:
+			raise ValueError(f"models in {model_config_file} and directories in {modelpath} differ: {sorted(set(locations) ^ (set(os.listdir(modelpath)) - {model_config_file}))}")
+
+		# Nur neue oder geänderte Modelle werden gebaut, unveränderte aus der vorherigen Konfiguration übernommen
+		self.fingerprints, self.by_location = {}, {}
+		new_locations = []
+		for location in locations:
+			self.fingerprints[location] = model_fingerprint(location)
+			if previous and previous.fingerprints.get(location) == self.fingerprints[location]:
+				self.by_location[location] = previous.by_location[location]
+			else:
+				new_locations.append(location)
+
+		# Die Modelle sind voneinander unabhängig und können parallel gebaut werden (MODEL_LOAD_THREADS)
+		def load(location):
+			logger.info(f"loading model {location}")
+			m = model(location, default = location in defaults)
+			logger.info(f"loaded model {location}: " + ", ".join(f"{part} {seconds:.2f}s" for part, seconds in m.load_times.items()))
+			warm_up(m)
+			return m
+		with ThreadPoolExecutor(max_workers=model_load_threads) as executor:
+			for location, m in zip(new_locations, executor.map(load, new_locations)):
+				self.by_location[location] = m
+		self.load_report = {location: {**self.by_location[location].load_times, "warmup": self.by_location[location].warmup_times} for location in new_locations}
+
+		self.models = {m.name: m for m in self.by_location.values()}
+		self.gui_models = {direction: self.by_location[locations[0]].name for direction, locations in self.model_config.items()}
+		self.modelnames = set(self.models.keys())
+
+		self.pivots = dict()
+		for direction, via in self.pivot_config.items():
+			src, tgt = direction.split('_')
+			if not (f'{src}_{via}' in self.model_config and f'{via}_{tgt}' in self.model_config):
+				raise ValueError(f"pivot direction {direction}: {src}_{via} and {via}_{tgt} must be directions with models in {model_config_file}")
+			self.pivots[direction] = pivot(self.models[self.gui_models[f'{src}_{via}']], self.models[self.gui_models[f'{via}_{tgt}']], via)
+			logger.info(f"pivot {direction} via {via}: {self.pivots[direction].name}, intermediate {self.pivots[direction].intermediate}")
+
+model_load_threads = int(os.environ.get('MODEL_LOAD_THREADS', 1))
+
+# Aufwärmen: Die erste Übersetzung eines Modells kompiliert die regulären Ausdrücke von sacremoses und SentenceSplitter,
+# initialisiert youtokentome und lässt CTranslate2 seinen Speicher anlegen. Damit das nicht die ersten Anfragen nach
+# einem Deploy trifft, übersetzt jedes neu geladene Modell vor /ready (bzw. vor dem Austausch beim Neuladen) für jede
+# seiner Richtungen einige Sätze, WARMUP_ROUNDS-mal (0 = aus). Die Sätze kommen aus WARMUP_CORPUS_DIR/<Quellsprache>.txt
+# (ein Satz pro Zeile), sonst aus default_warmup_sentences.
+warmup_rounds = int(os.environ.get('WARMUP_ROUNDS', 2))
+warmup_corpus_dir = os.environ.get('WARMUP_CORPUS_DIR')
+default_warmup_sentences = {
+	'de': ['Dies ist ein kurzer Test.',
+		   'Am 3. Mai 2024 um 14:30 Uhr beginnt die Veranstaltung im Rathaus von Bautzen.',
+		   'Weitere Informationen finden Sie unter https://www.sorbisch.de oder per E-Mail an info@sorbisch.de.',
+		   '„Das ist ein Zitat“, sagte sie, z.B. mit einem Zuwachs von 12,5 % im Jahr'],
+	'hsb': ['To je krótki test.',
+			'Dnja 3. meje 2024 w 14:30 hodź. so zarjadowanje na radnicy w Budyšinje započnje.',
+			'Dalše informacije namakaće pod https://www.serbja.de abo přez e-mejl na info@serbja.de.',
+			'„To je citat“, wona praji, na př. z přiběrkom 12,5 % za lěto'],
+	'dsb': ['To jo krotki test.',
+			'Dnja 3. maja 2024 zachopijo se zarědowanje w radnicy w Chóśebuzu.',
+			'Dalšne informacije namakajośo pód https://www.serby.de abo pśez e-mail na info@serby.de.',
+			'„To jo citat“, wóna groniše, na pś. z pśiběrkom 12,5 % na lěto'],
+	'cs': ['Toto je krátký test.',
+		   'Dne 3. května 2024 ve 14:30 začne akce na radnici v Budyšíně.',
+		   'Další informace najdete na https://www.sorbisch.de nebo e-mailem na info@sorbisch.de.',
+		   '„To je citát,“ řekla, např. s nárůstem 12,5 % za rok'],
+}
+
+def warmup_sentences(lang):
+	filename = f'{warmup_corpus_dir}/{lang}.txt' if warmup_corpus_dir else None
+	if filename and os.path.exists(filename):
+		with open(filename, encoding='utf-8') as f:
+			return [line.strip() for line in f if line.strip()]
+	return default_warmup_sentences.get(lang, default_warmup_sentences['de'])
+
+def warm_up(m):
+	"""Übersetzt die Aufwärm-Sätze für jede Richtung von m (mit Normalisierung und Satzzerlegung); setzt m.warmup_times."""
+	m.warmup_times = dict()
+	if warmup_rounds < 1: return
+	for direction in m.directions:
+		src, tgt = direction.split('_')
+		text = ' '.join(warmup_sentences(src))
+		seconds = []
+		for _ in range(warmup_rounds):
+			start = time.perf_counter()
+			m.translate_sentences(list(m.s_split(src, normalize([text])[0])), src, tgt)
+			seconds.append(time.perf_counter() - start)
+		# cold: erster Durchgang, warm: letzter Durchgang (so schnell sollte die erste echte Anfrage sein)
+		m.warmup_times[direction] = { "cold": round(seconds[0], 3), "warm": round(seconds[-1], 3) }
+		logger.info(f"warm-up {m.location} {direction}: cold {seconds[0]:.2f}s, warm {seconds[-1]:.2f}s")
+
+# Wird von startup() gesetzt; bis dahin ist der Webservice zwar erreichbar (/health), aber nicht bereit (/ready)
+registry = None
+startup_status = {"ready": False, "seconds": None, "models": {}}
+
+def startup():
+	global registry
+	start = time.perf_counter()
+	try:
+		placeholder_handling.prepare()
+		registry = model_registry()
+		startup_status.update(ready=True, seconds=time.perf_counter() - start, models=registry.load_report)
+		logger.info(f"startup finished after {startup_status['seconds']:.2f}s")
+	except Exception:
+		# wie früher beim Import: ohne Modelle ist der Webservice nutzlos, der Container soll neu starten
+		logger.exception("startup failed")
+		os._exit(1)
+
+def config_fingerprint():
+	return os.stat(f'{modelpath}/{model_config_file}').st_mtime_ns, tuple(
+		(location, model_fingerprint(location)) for location in sorted(set(os.listdir(modelpath)) - {model_config_file}))
+
+reload_lock = threading.Lock()
+reload_status = {"state": "idle", "message": "", "time": None}
+
+def reload_models():
+	"""Baut die Modelle neu auf (nur neue/geänderte) und tauscht registry atomar aus. Läuft höchstens einmal gleichzeitig."""
+	global registry
+	if not reload_lock.acquire(blocking=False): return False
+	try:
+		reload_status.update(state="running", message="", time=time.time())
+		if registry is None: raise ValueError('startup has not finished yet')
+		registry = model_registry(previous=registry)
+		reload_status.update(state="ok", message=f"{len(registry.models)} models", time=time.time())
+		logger.info(f"models reloaded: {sorted(registry.modelnames)}")
+	except Exception as e:
+		reload_status.update(state="failed", message=str(e), time=time.time())
+		logger.exception("reloading models failed, keeping previous models")
+	finally:
+		reload_lock.release()
+	return True
+
+def watch_models(interval):
+	# Einfaches Polling: bei Änderungen an model_config.yaml oder in einem Modellordner wird neu geladen
+	while registry is None: time.sleep(interval)
+	last = config_fingerprint()
+	while True:
+		time.sleep(interval)
+		try:
+			current = config_fingerprint()
+		except OSError:
+			continue
+		if current != last and reload_models(): last = current
+
+# Dokumente werden in Gruppen von höchstens document_chunk_sentences Sätzen vorverarbeitet, übersetzt und nachbearbeitet.
+# Damit ist der Speicherbedarf der Zwischenergebnisse (Tokens, BPE, Marker, Übersetzungsergebnisse) unabhängig von der
+# Länge des Dokuments, und max_text_length kann auch auf Dokumente im Megabyte-Bereich gesetzt werden.
+document_chunk_sentences = int(os.environ.get('DOCUMENT_CHUNK_SENTENCES', 64))
+max_text_length = int(os.environ.get('MAX_TEXT_LENGTH', 50000))
+
+# Zulassungskontrolle (siehe pipeline/admission.py): die Slots werden pro Gruppe von Sätzen belegt, so dass interaktive Anfragen
+# zwischen zwei Gruppen eines großen Dokuments an die Reihe kommen
+translation_slots = int(os.environ.get('TRANSLATION_SLOTS', 2))
+admission = admission_control(
+	slots=translation_slots,
+	bulk_slots=int(os.environ.get('BULK_SLOTS', max(1, translation_slots - 1))),
+	max_queue={'interactive': int(os.environ.get('MAX_QUEUE_INTERACTIVE', 16)), 'bulk': int(os.environ.get('MAX_QUEUE_BULK', 8))},
+	client_limit=int(os.environ.get('CLIENT_CONCURRENCY', 4)),
+	interactive_max_chars=int(os.environ.get('INTERACTIVE_MAX_CHARS', 2000)))
+# Header, der den Client identifiziert (z.B. X-Forwarded-For hinter einem Proxy); sonst die Adresse der Verbindung
+client_id_header = os.environ.get('CLIENT_ID_HEADER')
+
+# Translation Memory (siehe translation_memory.py), aktiv wenn TM_PATH gesetzt ist. TM_HINT: ähnliche Sätze als Hinweis
+# für den Decoder verwenden, 'prefix' = geschätzter gemeinsamer Anfang der Übersetzung als fester target_prefix,
+# 'bias' = ganze Übersetzung als target_prefix mit prefix_bias_beta TM_PREFIX_BIAS (der Decoder darf abweichen)
+tm_path = os.environ.get('TM_PATH')
+memory = translation_memory(tm_path, int(float(os.environ.get('TM_MAX_MB', 1024)) * 2**20),
+	threshold=float(os.environ.get('TM_THRESHOLD', 0.8))) if tm_path else None
+tm_hint = os.environ.get('TM_HINT') or None
+if not tm_hint in (None, 'prefix', 'bias'): raise ValueError(f"TM_HINT {tm_hint} is not one of prefix, bias")
+tm_prefix_bias = float(os.environ.get('TM_PREFIX_BIAS', 0.5))
+
+# Höchstzahl der Hypothesen pro Satz, die im /translate-Call mit num_hypotheses angefordert werden können
+max_hypotheses = int(os.environ.get('MAX_HYPOTHESES', 5))
+
+# Decoder-Cache (siehe decoder_cache.py), aktiv wenn DECODER_CACHE_PATH gesetzt ist
+cache_path = os.environ.get('DECODER_CACHE_PATH')
+cache = decoder_cache(cache_path, int(float(os.environ.get('DECODER_CACHE_MAX_MB', 1024)) * 2**20)) if cache_path else None
+
+def iter_lines(text):
+	# wie text.split('\n'), aber ohne die Liste aller Zeilen auf einmal zu erzeugen
+	start = 0
+	while True:
+		end = text.find('\n', start)
+		if end < 0:
+			yield text[start:]
+			return
+		yield text[start:end]
+		start = end + 1
+
+def translate_document(model, text, src, tgt, profile=None, lane='interactive', num_hypotheses=1, return_scores=False):
+	"""
+	Übersetzt text zeilenweise in Gruppen von document_chunk_sentences Sätzen; jede Gruppe belegt einen Slot in lane.
+
+	Returns:
+		input ([[str]]): Sätze pro Zeile (marked_input).
+		output ([[str]]): Übersetzungen pro Zeile (marked_translation).
+		vocabs ({str}): Wörter aus den Sätzen und den Übersetzungen.
+		extras ({str: [[...]]}): mit num_hypotheses > 1 "alternatives" (Liste der Übersetzungen pro Satz), mit
+			return_scores "scores" (Liste der Scores pro Satz, None für Sätze aus der Translation Memory), je pro Zeile.
+	"""
+	input, output, vocabs = [], [], set()
+	extras = {name: [] for name, requested in (("alternatives", num_hypotheses > 1), ("scores", return_scores)) if requested}
+	pending = []
+
+	def flush():
+		if pending:
+			with admission.slot(lane):
+				model.translate_records(pending, src, tgt, profile, vocabs, memory, cache, num_hypotheses, return_scores)
+			for record in pending:
+				output[record.line].append(record.translation)
+				if "alternatives" in extras: extras["alternatives"][record.line].append(record.alternatives or [record.translation])
+				if "scores" in extras: extras["scores"][record.line].append(record.scores)
+			pending.clear()
+
+	for i, line in enumerate(iter_lines(normalize([text])[0].rstrip())):
+		with pipeline.timed('split'):
+			sentences = list(model.s_split(src, line)) if len(line) else []
+		input.append(sentences)
+		output.append([])
+		for lines in extras.values(): lines.append([])
+		for sentence in sentences:
+			pending.append(sentence_record(sentence, i))
+			if len(pending) >= document_chunk_sentences: flush()
+	flush()
+	return input, output, vocabs, extras
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
@@ -221,27 +826,32 @@ CORS(app)
 @app.route('/translate', methods=['POST'])
 def translate_text():
 	try:
+		reg = registry # bleibt für diese Anfrage gültig, auch wenn währenddessen neu geladen wird
+		if reg is None: return { "errormsg": 'models are still loading' }, 503
 		reqdata = request.get_json()
-		wrong_params = set(reqdata.keys()) - {'source_language', 'target_language', 'model', 'text', 'debug'}
+		wrong_params = set(reqdata.keys()) - {'source_language', 'target_language', 'model', 'text', 'debug', 'profile', 'num_hypotheses', 'scores'}
 		if wrong_params: return { "errormsg": f'wrong parameter{"s" if len(wrong_params)>1 else ""} {" ".join(wrong_params)}' }
 
 		src = reqdata.get('source_language')
 		if src is None: return { "errormsg": 'missing source language' }
-		if not src in valid_sources: return { "errormsg": f'{src} is not a valid source language' }
+		if not src in reg.valid_sources: return { "errormsg": f'{src} is not a valid source language' }
 
 		tgt = reqdata.get('target_language')
 		if tgt is None: return { "errormsg": 'missing target language' }
-		if not tgt in valid_targets: return { "errormsg": f'{tgt} is not a valid target language' }
+		if not tgt in reg.valid_targets: return { "errormsg": f'{tgt} is not a valid target language' }
 
 		direction = src + '_' + tgt
-		if not direction in valid_directions: return { "errormsg": f'translations from {src} to {tgt} are not supported' }
+		if not direction in reg.valid_directions: return { "errormsg": f'translations from {src} to {tgt} are not supported' }
 
 		modelname = reqdata.get('model')
-		if modelname is None:
-			model = models[gui_models[direction]]
+		if direction in reg.pivots:
+			if modelname is not None: return { "errormsg": f"direction {direction} is translated via {reg.pivots[direction].via}, 'model' can't be chosen" }
+			model = reg.pivots[direction]
+		elif modelname is None:
+			model = reg.models[reg.gui_models[direction]]
 		else:
-			if modelname in modelnames:
-				model = models[modelname]
+			if modelname in reg.modelnames:
+				model = reg.models[modelname]
 				if not direction in model.directions: return { "errormsg": f"wrong combination: model {modelname} doesn't support direction {direction}" }
 			else:
 				return { "errormsg": f'model {modelname} is not available' }
@@ -249,44 +859,97 @@ def translate_text():
 		text = reqdata.get('text')
 		if text is None or len(str(text)) == 0: return { "errormsg": 'nothing to do' }
 		if not type(text) is str: return { "errormsg": f"'text': wrong type {type(text)}" }
-		if len(text) > 50000:
-			return {"errormsg": "Text is longer than 50000 characters."}
-
-		debug = reqdata.get('debug')
-		if debug is not None:
-			if not type(debug) is bool : return { "errormsg": f"'debug': you specified {debug} ({type(debug)}) but 'debug' should be true or false" }
-			if debug: return { "errormsg": "content for option 'debug' not specified => no operation so far" }
-
-		input = [list(model.s_split(src, line)) if len(line) else [] for line in prepareTranslationInputText(text).rstrip().split('\n')]
-		sentences_and_line_numbers = [(sentence, i) for (i, line) in enumerate(input) for sentence in line]
-		sentences, line_numbers = zip(*sentences_and_line_numbers)
-
-		translations, vocabs = model.translate_sentences(sentences, src, tgt)
-
-		lines_dict = defaultdict(list)
-		for translation, line in zip(translations, line_numbers):
-			lines_dict[line].append(translation)
-
-		# Convert dict to list of lists (sorted by line number if needed)
-		highest_line_num = max(lines_dict.keys())
-		output = [lines_dict[i] for i in range(highest_line_num+1)]
-
-
-		return {
+		if len(text) > max_text_length:
+			return {"errormsg": f"Text is longer than {max_text_length} characters."}
+
+		debug = reqdata.get('debug', False)
+		if not type(debug) is bool : return { "errormsg": f"'debug': you specified {debug} ({type(debug)}) but 'debug' should be true or false" }
+
+		profile = reqdata.get('profile')
+		if profile is not None and not profile in model.decoding_profiles:
+			return { "errormsg": f"decoding profile {profile} is not available for model {model.name}" }
+
+		num_hypotheses = reqdata.get('num_hypotheses', 1)
+		if not type(num_hypotheses) is int or not 1 <= num_hypotheses <= max_hypotheses:
+			return { "errormsg": f"'num_hypotheses' should be a number from 1 to {max_hypotheses}" }
+		scores = reqdata.get('scores', False)
+		if not type(scores) is bool: return { "errormsg": f"'scores': you specified {scores} ({type(scores)}) but 'scores' should be true or false" }
+
+		lane = admission.classify(request.headers.get('X-Priority'), len(text))
+		client = request.headers.get(client_id_header) if client_id_header else None
+		# debug: Zeiten der Schritte, Anzahl Sätze und Tokens und Batchgrößen dieser Anfrage (siehe pipeline.collect)
+		with pipeline.collect() if debug else nullcontext() as stats:
+			start = time.perf_counter()
+			with admission.admit(client or request.remote_addr, lane):
+				input, output, vocabs, extras = translate_document(model, text, src, tgt, profile, lane, num_hypotheses, scores)
+			with pipeline.timed('unks'):
+				unks = model.vocabs.unknown_words(vocabs) if model.return_unks else []
+
+		response = {
 			"marked_input": input,
 			"marked_translation": output,
+			**extras,
 			"model": model.name,
-			"unks": list(vocabs-model.vocabs) if model.return_unks else []
+			"unks": unks
 		}
+		if debug:
+			stats.add('total', time.perf_counter() - start)
+			response["debug"] = { **stats.result(), "sentences": sum(map(len, input)), "lane": lane, "document_chunk_sentences": document_chunk_sentences }
+		return response
+	except rejected as e:
+		return { "errormsg": str(e) }, e.status, { "Retry-After": str(e.retry_after) }
 	except Exception as e:
 		return {"errormsg": f"There was an error: {e}"}
 
+@app.route('/health', methods=['GET'])
+def health():
+	# Liveness: der Prozess läuft und beantwortet Anfragen, auch wenn die Modelle noch laden
+	return { "alive": True }
+
+@app.route('/ready', methods=['GET'])
+def ready():
+	# Readiness: alle Modelle sind geladen; mit Ladezeiten pro Modell
+	return startup_status, 200 if startup_status["ready"] else 503
+
+@app.route('/status', methods=['GET'])
+def status():
+	# Auslastung der Übersetzer-Slots und Spuren, Größe des Decoder-Caches und der Translation Memory, Aufrufe und Zeiten der Pipeline-Schritte
+	return { **admission.status(), "decoder_cache": cache.status() if cache is not None else None,
+		"translation_memory": memory.status() if memory is not None else None, "pipeline": pipeline.status() }
+
 @app.route('/info', methods=['GET'])
 def info():
-	output = "name", "directions", "traindate", "BLEU_score"
-	return jsonify({ "webservice_version": webservice_version, "models": [{item: getattr(model, item) for item in output} for model in models.values()] })
+	if registry is None: return { "errormsg": 'models are still loading' }, 503
+	output = "name", "directions", "traindate", "BLEU_score", "compute_type", "default_decoding_profile"
+	return jsonify({ "webservice_version": webservice_version, "models": [{**{item: getattr(model, item) for item in output}, "decoding_profiles": sorted(model.decoding_profiles), "placement": model.placement()} for model in registry.models.values()],
+					 "pivots": {direction: {"via": p.via, "models": [p.first.name, p.second.name], "intermediate": p.intermediate} for direction, p in registry.pivots.items()} })
+
+# Admin-Endpunkte sind nur aktiv, wenn ADMIN_TOKEN gesetzt ist; der Token muss im Header X-Admin-Token mitgeschickt werden
+admin_token = os.environ.get('ADMIN_TOKEN')
+
+@app.route('/admin/reload', methods=['GET', 'POST'])
+def admin_reload():
+	if not admin_token or request.headers.get('X-Admin-Token') != admin_token: return { "errormsg": 'forbidden' }, 403
+	if request.method == 'POST':
+		if reload_lock.locked(): return { "errormsg": 'reload already running', **reload_status }, 409
+		threading.Thread(target=reload_models, daemon=True).start()
+		return { "state": "started" }, 202
+	return reload_status
+
+@app.route('/debug/profile', methods=['GET'])
+def debug_profile():
+	# Sampling-Profiler (pipeline/profiler.py), nur mit PROFILER_MAX_SECONDS; ist ADMIN_TOKEN gesetzt, wird auch der Token verlangt
+	if admin_token and request.headers.get('X-Admin-Token') != admin_token: return { "errormsg": 'forbidden' }, 403
+	return profiler.profile_response(request.args)
 
 if __name__ == '__main__':
 	# app.run('0.0.0.0', 5000, ssl_context='adhoc')
+	# Die Modelle werden im Hintergrund geladen, damit der Webservice sofort /health beantworten kann
+	threading.Thread(target=startup, daemon=True).start()
+	# MODEL_WATCH_INTERVAL (Sekunden): model_config.yaml und Modellordner auf Änderungen überwachen und automatisch neu laden
+	if os.environ.get('MODEL_WATCH_INTERVAL'):
+		threading.Thread(target=watch_models, args=(float(os.environ['MODEL_WATCH_INTERVAL']),), daemon=True).start()
 	from waitress import serve
-	serve(app, host="0.0.0.0", port=5000)
+	# wartende Anfragen belegen einen waitress-Thread; es muss mehr Threads geben als MAX_QUEUE_INTERACTIVE + MAX_QUEUE_BULK,
+	# sonst warten Anfragen in der Reihenfolge ihres Eingangs schon in waitress
+	serve(app, host="0.0.0.0", port=5000, threads=int(os.environ.get('WAITRESS_THREADS', 32)))
@@ -0,0 +1,587 @@
+# -*- coding: utf-8 -*-
+
+# Benchmarks für den Webservice. Aufruf im Container (bzw. im Verzeichnis mit models/ und version.txt), z.B.
+#   python benchmark.py quantization --model 2024-08-09_de2hsb --direction de_hsb --source test.de --reference test.hsb
+# Die Testdateien enthalten einen Satz pro Zeile.
+#   python benchmark.py normalization [--length 50000]
+# braucht keine Modelle.
+#   python benchmark.py document_memory --model 2024-08-09_de2hsb --direction de_hsb --text dokument.de
+# misst den Speicherbedarf (Python-Allokationen, tracemalloc) beim Übersetzen großer Dokumente.
+#   python benchmark.py admission --direction de_hsb --source test.de [--bulk 4]
+# misst die Latenz interaktiver Anfragen unter bulk-Last (lädt alle Modelle wie der Webservice).
+#   python benchmark.py placement --load t2k_js_de_hsb_2025-07-17_lmu:de_hsb:test.de 2023-02-17_cs2hsb:cs_hsb:test.cs
+# misst den Durchsatz bei gleichzeitiger Last auf mehreren Modellen ohne und mit cpu_cores/inter_threads/intra_threads.
+#   python benchmark.py records [--model 2022-02-02_de2hsb --direction de_hsb] [--sentences 5000] [--decoder]
+# misst Speicherspitze, Allokationen und GC-Läufe der Pipeline für ein Dokument (ohne --decoder ohne Modellgewichte).
+#   python benchmark.py vocabulary [--vocabulary models/2024-08-09_de2hsb/train_vocabulary.txt]
+# vergleicht Speicher und Zeit pro Wort von vocabulary_index (unks) mit einem set (braucht keine Modelle).
+#   python benchmark.py translation_memory [--entries 1000000] [--path tm.db]
+# misst die Suchzeiten der Translation Memory (braucht keine Modelle).
+#   python benchmark.py decoder_cache --model 2024-08-09_de2hsb --direction de_hsb --text dokument.de
+# misst die Übersetzungszeit ohne, mit leerem und mit gefülltem Decoder-Cache sowie nach erneutem Öffnen der Datei.
+#   python benchmark.py protected_patterns [--basic] [--text korpus.hsb]
+# vergleicht Tokenisierung und Zeit mit den einmal kompilierten protected patterns (braucht keine Modelle).
+#   python benchmark.py nbest --model 2024-08-09_de2hsb --direction de_hsb --text dokument.de [--hypotheses 1 2 5]
+# misst die Übersetzungszeit mit mehreren Hypothesen und Scores pro Satz.
+#   python benchmark.py pivot --direction cs_de --text dokument.cs
+# vergleicht eine Pivot-Richtung aus model_config.yaml mit zwei hintereinander ausgeführten Übersetzungen.
+
+import argparse, time, random, re, timeit, threading, gc
+
+
+def read_lines(filename):
+	with open(filename, encoding='utf-8') as f:
+		return [line.strip() for line in f]
+
+
+def timed_translate(m, sentences, src, tgt):
+	start = time.perf_counter()
+	translations, _ = m.translate_sentences(sentences, src, tgt)
+	return list(translations), time.perf_counter() - start
+
+
+def reference_score(score):
+	# model_info.yaml enthält teils Text hinter dem Wert, z.B. "64.5 (altes Testset)"
+	match = re.match(r'\s*(-?\d+(?:\.\d+)?)', str(score)) if score is not None else None
+	return float(match.group(1)) if match else float('nan')
+
+
+def quantization(args):
+	"""
+	Vergleicht Übersetzungsqualität (BLEU/TER) und Geschwindigkeit eines Modells für verschiedene compute_types.
+	Die Scores werden dem in model_info.yaml hinterlegten BLEU_score/TER_score gegenübergestellt.
+	"""
+	import sacrebleu
+	import CTranslator
+
+	src, tgt = args.direction.split('_')
+	sentences, references = read_lines(args.source), read_lines(args.reference)
+	assert len(sentences) == len(references), 'source and reference differ in length'
+
+	print(f"{'compute_type':<14}{'BLEU':>8}{'ΔBLEU':>8}{'TER':>8}{'ΔTER':>8}{'sent/s':>10}{'speedup':>9}")
+	baseline = None
+	for compute_type in args.compute_types:
+		m = CTranslator.model(args.model, compute_type=compute_type)
+		translations, seconds = timed_translate(m, sentences, src, tgt)
+		bleu = sacrebleu.corpus_bleu(translations, [references]).score
+		ter = sacrebleu.corpus_ter(translations, [references]).score
+		baseline = baseline or seconds
+		delta_bleu = bleu - reference_score(m.BLEU_score)
+		delta_ter = ter - reference_score(m.TER_score)
+		print(f"{m.compute_type:<14}{bleu:>8.2f}{delta_bleu:>8.2f}{ter:>8.2f}{delta_ter:>8.2f}{len(sentences)/seconds:>10.1f}{baseline/seconds:>9.2f}")
+
+
+def prepare_reference(text):
+	# prepareTranslationInputText vor der Auslagerung nach normalization.py, als Referenz für Ausgabe und Laufzeit
+	text = text.translate(str.maketrans('\u00A0', ' ', '\u00AD\u200B\r'))
+	text = re.sub(r"[ \t]+", " ", text)
+	for f, r in ('A\u0308','Ä'), ('O\u0308','Ö'), ('U\u0308','Ü'), ('a\u0308','ä'), ('o\u0308','ö'), ('u\u0308','ü'), ('ﬀ','ff'), ('ﬁ','fi'), ('ﬂ','fl'), ('ﬅ','ft'):
+		if f in text:
+			text = text.replace(f, r)
+	return text.replace(" \n", "\n")
+
+
+def normalization(args):
+	"""Vergleicht prepareTranslationInputText mit der früheren Implementierung auf einem Text der Länge --length."""
+	from pipeline.normalization import prepareTranslationInputText
+
+	random.seed(0)
+	pieces = ['Serbske', 'słowo', 'Wörter', 'Bru\u0308cke', 'scho\u0308n', 'A\u0308pfel', 'ﬁnden', 'Auﬂage', 'Trennstri\u00ADche',
+			  'null\u200Bbreit', 'ge\u00A0schützt', '.', ',', ' ', ' ', '  ', '\t', ' \n', '\r\n']
+	text = ''
+	while len(text) < args.length:
+		text += random.choice(pieces) + ' '
+	text = text[:args.length]
+
+	assert prepareTranslationInputText(text) == prepare_reference(text), 'output differs from reference'
+	reference = min(timeit.repeat(lambda: prepare_reference(text), number=args.number, repeat=5)) / args.number
+	current = min(timeit.repeat(lambda: prepareTranslationInputText(text), number=args.number, repeat=5)) / args.number
+	print(f"{len(text)} characters: reference {reference*1000:.3f} ms, pipeline/normalization.py {current*1000:.3f} ms, speedup {reference/current:.2f}, output identical")
+
+
+def document_memory(args):
+	"""
+	Übersetzt aus --text zusammengesetzte Dokumente der Größen --sizes einmal in Gruppen von --chunk Sätzen und einmal
+	in einem einzigen Batch und vergleicht die Spitzen der Python-Allokationen.
+	"""
+	import tracemalloc
+	import CTranslator
+
+	src, tgt = args.direction.split('_')
+	m = CTranslator.model(args.model)
+	sample = open(args.text, encoding='utf-8').read()
+
+	print(f"{'characters':>12}{'chunk':>10}{'peak MB':>10}{'seconds':>10}")
+	for size in args.sizes:
+		text = (sample * (size // len(sample) + 1))[:size]
+		for chunk in (args.chunk, size):
+			CTranslator.document_chunk_sentences = chunk
+			tracemalloc.start()
+			start = time.perf_counter()
+			CTranslator.translate_document(m, text, src, tgt)
+			seconds = time.perf_counter() - start
+			peak = tracemalloc.get_traced_memory()[1]
+			tracemalloc.stop()
+			print(f"{size:>12}{chunk if chunk < size else 'all':>10}{peak/2**20:>10.1f}{seconds:>10.2f}")
+
+
+def admission(args):
+	"""
+	Schickt nacheinander einzelne Sätze aus --source als interaktive Anfragen an /translate, während --bulk Clients
+	ununterbrochen das ganze --source als ein Dokument übersetzen lassen. Gemessen wird die Latenz der interaktiven
+	Anfragen ohne Last, mit den konfigurierten Spuren und mit einer gemeinsamen Warteschlange für alle Anfragen.
+	"""
+	import CTranslator
+	from pipeline.admission import admission_control
+
+	CTranslator.startup()
+	client = CTranslator.app.test_client()
+	src, tgt = args.direction.split('_')
+	sentences = read_lines(args.source)
+	document = '\n'.join(sentences)[:CTranslator.max_text_length]
+
+	def post(text, address):
+		response = client.post('/translate', json={"source_language": src, "target_language": tgt, "text": text},
+							   environ_base={"REMOTE_ADDR": address})
+		assert response.status_code == 200 and "marked_translation" in response.json, response.json
+
+	fifo = admission_control(slots=CTranslator.translation_slots, bulk_slots=CTranslator.translation_slots,
+							 max_queue={'interactive': 1000, 'bulk': 1000}, client_limit=1000, interactive_max_chars=0)
+	scenarios = ('idle', 0, CTranslator.admission), ('lanes', args.bulk, CTranslator.admission), ('single queue', args.bulk, fifo)
+
+	print(f"{'scenario':<14}{'bulk':>6}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+	for name, bulk, control in scenarios:
+		CTranslator.admission = control
+		stop = threading.Event()
+
+		def load(address):
+			while not stop.is_set():
+				post(document, address)
+
+		threads = [threading.Thread(target=load, args=(f'10.0.0.{i}',)) for i in range(bulk)]
+		for thread in threads: thread.start()
+		time.sleep(args.warmup if bulk else 0)
+		latencies = []
+		for i in range(args.requests):
+			start = time.perf_counter()
+			post(sentences[i % len(sentences)], '10.0.1.1')
+			latencies.append(time.perf_counter() - start)
+		stop.set()
+		for thread in threads: thread.join()
+
+		latencies.sort()
+		p50, p99 = latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+		print(f"{name:<14}{bulk:>6}{p50*1000:>10.1f}{p99*1000:>10.1f}{latencies[-1]*1000:>10.1f}")
+
+
+def placement(args):
+	"""
+	Lässt für jedes --load (Modellordner:Richtung:Datei) --clients Clients --seconds Sekunden lang ununterbrochen Gruppen
+	von --batch Sätzen übersetzen, einmal ohne und einmal mit der Kernzuordnung aus model_info.yaml, und gibt die Sätze
+	pro Sekunde pro Modell aus.
+	"""
+	import CTranslator
+
+	loads = [spec.split(':') for spec in args.load]
+	print(f"{'scenario':<10}{'model':<36}{'placement':<28}{'sent/s':>10}")
+	for name, placed in ('unplaced', False), ('placed', True):
+		models = {location: CTranslator.model(location, placement=placed) for location, _, _ in loads}
+		counts = {location: 0 for location, _, _ in loads}
+		deadline = time.perf_counter() + args.seconds
+		lock = threading.Lock()
+
+		def run(location, direction, filename):
+			src, tgt = direction.split('_')
+			sentences = read_lines(filename)
+			i = 0
+			while time.perf_counter() < deadline:
+				batch = [sentences[(i + j) % len(sentences)] for j in range(args.batch)]
+				models[location].translate_sentences(batch, src, tgt)
+				i += args.batch
+				with lock: counts[location] += len(batch)
+
+		threads = [threading.Thread(target=run, args=load) for load in loads for _ in range(args.clients)]
+		for thread in threads: thread.start()
+		for thread in threads: thread.join()
+		for location, m in models.items():
+			p = m.placement()
+			print(f"{name:<10}{location:<36}{str(p['cpu_cores']) + ' ' + str(p['inter_threads']) + 'x' + str(p['intra_threads']):<28}{counts[location]/args.seconds:>10.1f}")
+		print(f"{name:<10}{'total':<36}{'':<28}{sum(counts.values())/args.seconds:>10.1f}")
+		del models
+
+
+class echo_result:
+	def __init__(self, tokens):
+		self.hypotheses, self.scores = [tokens], [0.0]
+
+
+class echo_translator:
+	"""Ersatz für ctranslate2.Translator ohne Gewichte: gibt die BPE-Tokens jedes Satzes unverändert als Übersetzung zurück."""
+	def __init__(self, path, device='cpu', compute_type='default', **options):
+		self.compute_type = 'float32' if compute_type == 'default' else compute_type
+
+	def translate_batch(self, batch, target_prefix=None, **options):
+		return [echo_result(list(tokens)) for tokens in batch]
+
+
+def records(args):
+	"""
+	Misst Spitze der Python-Allokationen, Anzahl Speicherblöcke und GC-Läufe der Pipeline beim Übersetzen eines Dokuments
+	mit --sentences Sätzen (translate_document: Satzzerlegung, Platzhalter, Tokenisierung, BPE, Nachbearbeitung).
+	Ohne --decoder ersetzt echo_translator den CTranslate2-Translator; gemessen wird dann nur die Python-Seite, und es
+	genügen codes-yttm und model_info.yaml im Modellordner. Die Sätze kommen aus --text (ein Satz pro Zeile) oder aus den
+	Aufwärm-Sätzen der Quellsprache, je --per_line Sätze pro Zeile. --chunk 0 übersetzt das Dokument in einer Gruppe.
+	"""
+	import tracemalloc, logging
+	import CTranslator
+
+	src, tgt = args.direction.split('_')
+	if not args.decoder: CTranslator.ctranslate2.Translator = echo_translator
+	m = CTranslator.model(args.model)
+	sample = read_lines(args.text) if args.text else CTranslator.default_warmup_sentences[src]
+	sentences = [sample[i % len(sample)] for i in range(args.sentences)]
+	text = '\n'.join(' '.join(sentences[i:i + args.per_line]) for i in range(0, len(sentences), args.per_line))
+	CTranslator.document_chunk_sentences = args.chunk or len(sentences)
+	CTranslator.cache = CTranslator.memory = None
+	# die Log-Ausgaben pro Satz würden die Messung überdecken
+	logging.disable(logging.INFO)
+
+	CTranslator.translate_document(m, text, src, tgt) # Aufwärmen (reguläre Ausdrücke, Caches von sacremoses)
+	print(f"{'sentences':>10}{'peak KB':>10}{'B/sentence':>12}{'blocks':>10}{'gc runs':>9}{'gen 2':>7}{'seconds':>9}")
+	for _ in range(args.repeat):
+		gc.collect()
+		before = [stats['collections'] for stats in gc.get_stats()]
+		tracemalloc.start()
+		start = time.perf_counter()
+		result = CTranslator.translate_document(m, text, src, tgt)
+		seconds = time.perf_counter() - start
+		peak = tracemalloc.get_traced_memory()[1]
+		blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+		tracemalloc.stop()
+		del result
+		collections = [stats['collections'] - b for stats, b in zip(gc.get_stats(), before)]
+		print(f"{len(sentences):>10}{peak/1024:>10.0f}{peak/len(sentences):>12.0f}{blocks:>10}{sum(collections):>9}{collections[2]:>7}{seconds:>9.2f}")
+
+
+def vocabulary(args):
+	"""
+	Vergleicht das set aus train_vocabulary.txt (--vocabulary, sonst --words synthetische Wörter) mit vocabulary_index:
+	Speicher (Python-Allokationen) und Zeit pro Wort für unknown_words auf Anfragen mit Zipf-verteilten Wörtern.
+	"""
+	import os, tempfile, tracemalloc
+	import vocabulary_index
+
+	random.seed(0)
+	filename = args.vocabulary
+	if filename is None:
+		letters = 'abcdefghijklmnopqrstuvwxyzěščřžýáíéłóäöü'
+		words = list(dict.fromkeys(''.join(random.choices(letters, k=random.randint(2, 14))) for _ in range(args.words)))
+		filename = os.path.join(tempfile.mkdtemp(), 'train_vocabulary.txt')
+		with open(filename, 'w', encoding='utf-8') as f: f.write('\n'.join(words))
+
+	tracemalloc.start()
+	with open(filename, encoding='utf-8') as f:
+		words = set(f.read().split('\n'))
+	set_bytes = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	index = vocabulary_index.load(filename)
+	index_file = os.path.join(vocabulary_index.index_dir, vocabulary_index.file_digest(filename) + '.vocidx2')
+
+	ranked = sorted(words)
+	random.shuffle(ranked)
+	pool = ranked + [f'unbekannt{i}' for i in range(len(ranked) // 10)]
+	weights = [1 / (rank + 1) for rank in range(len(ranked))] + [0.5 / len(ranked)] * (len(ranked) // 10)
+	requests = [list(set(random.choices(pool, weights, k=args.request_words))) for _ in range(args.requests)]
+	for request in requests:
+		assert sorted(index.unknown_words(request)) == sorted(word for word in request if not word in words), 'unknown words differ'
+	n = sum(map(len, requests))
+
+	reference = min(timeit.repeat(lambda: [[word for word in request if not word in words] for request in requests], number=3, repeat=3)) / 3 / n
+	index.cache.clear()
+	first = timeit.timeit(lambda: [index.unknown_words(request) for request in requests], number=1) / n
+	steady = min(timeit.repeat(lambda: [index.unknown_words(request) for request in requests], number=3, repeat=3)) / 3 / n
+	print(f"{len(words)} words: set {set_bytes/2**20:.1f} MB, index file {os.path.getsize(index_file)/2**20:.1f} MB (mmap) + cache of {len(index.cache)} words")
+	print(f"ns per word: set {reference*1e9:.0f}, index first pass {first*1e9:.0f}, index with cache {steady*1e9:.0f}")
+
+
+def percentiles(seconds):
+	seconds = sorted(seconds)
+	return seconds[len(seconds) // 2] * 1000, seconds[min(len(seconds) - 1, int(len(seconds) * 0.99))] * 1000
+
+
+def translation_memory(args):
+	"""
+	Füllt eine Translation Memory mit --entries synthetischen Sätzen (oder verwendet eine vorhandene unter --path) und
+	misst die Suchzeit pro Satz für exakte Treffer, Sätze mit einem geänderten Wort und unbekannte Sätze.
+	"""
+	import os, tempfile
+	from translation_memory import translation_memory
+
+	random.seed(0)
+	vocabulary = [f'słowo{i}' for i in range(args.vocabulary)]
+	def sentence():
+		return ' '.join(random.choices(vocabulary, k=random.randint(8, 20))) + '.'
+
+	path = args.path or os.path.join(tempfile.gettempdir(), f'tm_benchmark_{args.entries}.db')
+	memory = translation_memory(path, 2**40, threshold=args.threshold)
+	start = time.perf_counter()
+	while len(memory) < args.entries:
+		batch = [sentence() for _ in range(min(10000, args.entries - len(memory)))]
+		memory.add('benchmark', '', 'de_hsb', [(source, source.upper()) for source in batch])
+		print(f"\r{len(memory)} entries", end='', flush=True)
+	print(f"\r{len(memory)} entries in {path}, built in {time.perf_counter() - start:.0f}s")
+
+	# Stichprobe vorhandener Sätze für exakte und ähnliche Treffer
+	stored = [row[0] for row in memory.connection.execute('SELECT source FROM entries ORDER BY random() LIMIT ?', (args.queries,))]
+	def change_one_word(source):
+		words = source[:-1].split()
+		words[random.randrange(len(words))] = random.choice(vocabulary)
+		return ' '.join(words) + '.'
+	queries = ('exact', stored), ('one word changed', [change_one_word(source) for source in stored]), ('unknown', [sentence() for _ in stored])
+
+	print(f"{'queries':<18}{'found':>8}{'p50 ms':>10}{'p99 ms':>10}")
+	for name, sentences in queries:
+		seconds, found = [], 0
+		for query in sentences:
+			start = time.perf_counter()
+			result = memory.lookup('benchmark', '', 'de_hsb', [query])[0]
+			seconds.append(time.perf_counter() - start)
+			found += result is not None
+		p50, p99 = percentiles(seconds)
+		print(f"{name:<18}{found/len(sentences):>8.1%}{p50:>10.2f}{p99:>10.2f}")
+
+
+def decoder_cache(args):
+	"""
+	Übersetzt --text einmal ohne Cache, dann mit einem leeren und einem gefüllten Cache und schließlich mit einem neu
+	geöffneten Cache (wie nach einem Neustart oder in einem anderen Prozess), und prüft, dass die Übersetzungen gleich sind.
+	"""
+	import os, tempfile
+	import CTranslator
+	from decoder_cache import decoder_cache
+
+	src, tgt = args.direction.split('_')
+	m = CTranslator.model(args.model)
+	text = open(args.text, encoding='utf-8').read()
+	path = os.path.join(tempfile.mkdtemp(), 'decoder_cache.db')
+	cache = decoder_cache(path, 2**30)
+
+	print(f"{'cache':<12}{'seconds':>10}  identical")
+	reference = None
+	for name in 'none', 'empty', 'filled', 'reopened':
+		if name == 'reopened': cache = decoder_cache(path, 2**30)
+		CTranslator.cache = None if name == 'none' else cache
+		start = time.perf_counter()
+		_, output, _, _ = CTranslator.translate_document(m, text, src, tgt)
+		seconds = time.perf_counter() - start
+		reference = reference or output
+		print(f"{name:<12}{seconds:>10.2f}  {output == reference}")
+	print(cache.status())
+
+
+def protected_patterns(args):
+	"""
+	Vergleicht die Tokenisierung mit MosesTokenizer.tokenize(..., protected_patterns=[...]) und mit den einmal kompilierten
+	Mustern aus protected_patterns.py auf einem Regressionskorpus (--text oder synthetische Sätze mit Platzhaltern, URLs,
+	E-Mail-Adressen und XML-Tags) für alle Sprachen in nonbreaking_prefixes/ und misst die Zeit pro Satz.
+	"""
+	import os
+	from sacremoses import MosesTokenizer
+	import protected_patterns
+
+	patterns = protected_patterns.load(args.patterns)
+	if args.basic: patterns = protected_patterns.protected_patterns(patterns.patterns + MosesTokenizer.BASIC_PROTECTED_PATTERNS)
+	if args.text:
+		sentences = read_lines(args.text)
+	else:
+		random.seed(0)
+		words = ['Serbske', 'słowo', 'Wörter', 'je', 'a', 'to', 'z', 'wjele', 'der', 'die', 'und', 'Budyšin', 'Chóśebuz', 'dźěło', 'ISBN-10', '5,300']
+		# Sonderfälle für den Vergleich: Platzhalter allein und an Wörtern, Satzzeichen, URLs, E-Mail, XML, Marker im Text
+		specials = ['⟦⟧', '⟦⟧', '⟦⟧', '⟦', '⟧', 'x⟦⟧y', '⟦⟧.', '(⟦⟧)', 'z.B.', 'Dr.', 'str.', '-', '--', '...', ',', '"', "'", '&',
+					'<', '>', 'https://www.sorbisch.de/pages/hsb', 'www.serbja.de/x?y=1', 'info@serbja.de', '<b>', '</b>', '<a href="x">',
+					'THISISPROTECTED000', 'THISISPROTECTEDX001', '\t', '  ']
+		sentences = [' '.join(random.choice(specials if random.random() < 0.2 else words) for _ in range(random.randint(1, 25))) + '.'
+					 for _ in range(args.sentences)]
+
+	# die Tokenisierung selbst dauert viel länger als der Schutz der Muster; verglichen wird der Aufwand über tokenize() ohne Muster
+	print(f"{'language':<10}{'options':<16}{'tokenize µs':>13}{'sacremoses +µs':>16}{'compiled +µs':>14}")
+	for filename in sorted(os.listdir('nonbreaking_prefixes')):
+		if not filename.startswith('nonbreaking_prefix.'): continue
+		lang = filename.split('.')[-1]
+		tokenizer = MosesTokenizer(lang, custom_nonbreaking_prefixes_file=f'nonbreaking_prefixes/{filename}')
+		for options in ({'aggressive_dash_splits': False, 'escape': False}, {'aggressive_dash_splits': True, 'escape': True}):
+			runs = {
+				'plain': lambda: [tokenizer.tokenize(s, return_str=False, **options) for s in sentences],
+				'reference': lambda: [tokenizer.tokenize(s, protected_patterns=patterns.patterns, return_str=False, **options) for s in sentences],
+				'compiled': lambda: [patterns.tokenize(tokenizer, s, **options) for s in sentences],
+			}
+			differences = [(s, a, b) for s, a, b in zip(sentences, runs['reference'](), runs['compiled']()) if a != b]
+			assert not differences, f'tokenization differs: {differences[:3]}'
+			seconds = {name: [] for name in runs}
+			for _ in range(args.repeat):
+				for name, run in runs.items():
+					seconds[name].append(timeit.timeit(run, number=1))
+			plain, reference, compiled = (min(seconds[name]) / len(sentences) * 1e6 for name in runs)
+			flags = ','.join(name[:6] for name, value in options.items() if value) or '-'
+			print(f"{lang:<10}{flags:<16}{plain:>13.1f}{reference - plain:>16.1f}{compiled - plain:>14.1f}")
+	print(f"{len(sentences)} sentences, {len(patterns.patterns)} patterns, tokenization identical")
+
+
+def nbest(args):
+	"""
+	Übersetzt --text ohne Scores und mit num_hypotheses 1 (nur Scores) und --hypotheses und vergleicht die Zeit mit
+	der normalen Übersetzung. Mit num_hypotheses > 1 wird beam_size bei Bedarf auf num_hypotheses erhöht; ausgegeben
+	wird daher auch, wie oft die beste Hypothese von der normalen Übersetzung abweicht.
+	"""
+	import CTranslator
+
+	src, tgt = args.direction.split('_')
+	m = CTranslator.model(args.model)
+	text = open(args.text, encoding='utf-8').read()[:CTranslator.max_text_length]
+	print(f"beam_size of profile {m.default_decoding_profile}: {m.decoding_profiles[m.default_decoding_profile].get('beam_size', 2)}")
+
+	def run(num_hypotheses, return_scores):
+		seconds = min(timeit.repeat(lambda: CTranslator.translate_document(m, text, src, tgt, num_hypotheses=num_hypotheses, return_scores=return_scores),
+									number=1, repeat=args.repeat))
+		return CTranslator.translate_document(m, text, src, tgt, num_hypotheses=num_hypotheses, return_scores=return_scores)[1], seconds
+
+	reference, baseline = run(1, False)
+	sentences = [translation for line in reference for translation in line]
+	print(f"{'hypotheses':>10}{'scores':>8}{'seconds':>10}{'relative':>10}{'best differs':>14}")
+	print(f"{1:>10}{'no':>8}{baseline:>10.2f}{1:>10.2f}{0:>14}")
+	for num_hypotheses in args.hypotheses:
+		output, seconds = run(num_hypotheses, True)
+		differs = sum(a != b for a, b in zip(sentences, (translation for line in output for translation in line)))
+		print(f"{num_hypotheses:>10}{'yes':>8}{seconds:>10.2f}{seconds/baseline:>10.2f}{differs:>14}")
+
+
+def pivot(args):
+	"""
+	Übersetzt --text über die Pivotsprache einmal wie ein Client mit zwei Übersetzungen hintereinander (das Zwischenergebnis
+	als Text, neu in Sätze zerlegt) und einmal mit der Pivot-Richtung. Zum Vergleich die Zeiten der beiden Schritte allein.
+	"""
+	import CTranslator
+
+	CTranslator.startup()
+	p = CTranslator.registry.pivots[args.direction]
+	src, tgt = args.direction.split('_')
+	text = open(args.text, encoding='utf-8').read()[:CTranslator.max_text_length]
+	joined = lambda output: '\n'.join(' '.join(line) for line in output)
+
+	def first():
+		return CTranslator.translate_document(p.first, text, src, p.via)[1]
+	intermediate = joined(first())
+
+	def second():
+		return CTranslator.translate_document(p.second, intermediate, p.via, tgt)[1]
+
+	def chained():
+		return CTranslator.translate_document(p.second, joined(first()), p.via, tgt)[1]
+
+	def server():
+		return CTranslator.translate_document(p, text, src, tgt)[1]
+
+	print(f"{args.direction} via {p.via}: {p.name}, intermediate {p.intermediate}")
+	print(f"{'':<18}{'seconds':>10}")
+	for name, run in ('first hop', first), ('second hop', second), ('chained', chained), ('pivot', server):
+		print(f"{name:<18}{min(timeit.repeat(run, number=1, repeat=args.repeat)):>10.2f}")
+	reference, output = joined(chained()).split('\n'), joined(server()).split('\n')
+	print(f"lines differing from the chained translation: {sum(a != b for a, b in zip(reference, output))} of {len(reference)}")
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+	p = subparsers.add_parser('quantization', help='BLEU/TER and speed per compute_type')
+	p.add_argument('--model', required=True, help='model directory in models/')
+	p.add_argument('--direction', required=True, help='e.g. de_hsb')
+	p.add_argument('--source', required=True, help='source sentences, one per line')
+	p.add_argument('--reference', required=True, help='reference translations, one per line')
+	p.add_argument('--compute-types', nargs='+', default=['default', 'int8', 'int8_float32', 'int16'])
+	p.set_defaults(func=quantization)
+
+	p = subparsers.add_parser('normalization', help='prepareTranslationInputText against the previous implementation')
+	p.add_argument('--length', type=int, default=50000)
+	p.add_argument('--number', type=int, default=20)
+	p.set_defaults(func=normalization)
+
+	p = subparsers.add_parser('document_memory', help='peak memory of chunked against single-batch document translation')
+	p.add_argument('--model', required=True, help='model directory in models/')
+	p.add_argument('--direction', required=True, help='e.g. de_hsb')
+	p.add_argument('--text', required=True, help='sample text, repeated up to the document sizes')
+	p.add_argument('--sizes', type=int, nargs='+', default=[50000, 200000, 1000000])
+	p.add_argument('--chunk', type=int, default=64, help='sentences per chunk')
+	p.set_defaults(func=document_memory)
+
+	p = subparsers.add_parser('admission', help='latency of interactive requests under bulk load')
+	p.add_argument('--direction', required=True, help='e.g. de_hsb')
+	p.add_argument('--source', required=True, help='sentences, one per line; all of them form the bulk document')
+	p.add_argument('--bulk', type=int, default=4, help='number of bulk clients')
+	p.add_argument('--requests', type=int, default=200, help='number of interactive requests per scenario')
+	p.add_argument('--warmup', type=float, default=2, help='seconds of bulk load before measuring')
+	p.set_defaults(func=admission)
+
+	p = subparsers.add_parser('placement', help='throughput under mixed-direction load with and without cpu_cores')
+	p.add_argument('--load', required=True, nargs='+', help='model directory:direction:sentence file, e.g. 2023-02-17_cs2hsb:cs_hsb:test.cs')
+	p.add_argument('--clients', type=int, default=2, help='concurrent clients per model')
+	p.add_argument('--batch', type=int, default=8, help='sentences per request')
+	p.add_argument('--seconds', type=float, default=30)
+	p.set_defaults(func=placement)
+
+	p = subparsers.add_parser('records', help='peak memory, allocations and gc runs of the pipeline for one document')
+	p.add_argument('--model', default='2022-02-02_de2hsb')
+	p.add_argument('--direction', default='de_hsb')
+	p.add_argument('--text', help='sentence file (default: warm-up sentences of the source language)')
+	p.add_argument('--sentences', type=int, default=5000)
+	p.add_argument('--per_line', type=int, default=4, help='sentences per line of the document')
+	p.add_argument('--chunk', type=int, default=0, help='document_chunk_sentences (0: whole document in one group)')
+	p.add_argument('--repeat', type=int, default=3)
+	p.add_argument('--decoder', action='store_true', help='use the CTranslate2 model instead of echo_translator')
+	p.set_defaults(func=records)
+
+	p = subparsers.add_parser('vocabulary', help='memory and lookup time of vocabulary_index against a set')
+	p.add_argument('--vocabulary', help='train_vocabulary.txt (default: synthetic words)')
+	p.add_argument('--words', type=int, default=300000)
+	p.add_argument('--requests', type=int, default=200)
+	p.add_argument('--request_words', type=int, default=400, help='words drawn per request (distinct words are looked up)')
+	p.set_defaults(func=vocabulary)
+
+	p = subparsers.add_parser('translation_memory', help='lookup latency of the translation memory')
+	p.add_argument('--entries', type=int, default=1000000)
+	p.add_argument('--path', help='database file (default: temporary file per size, reused by later runs)')
+	p.add_argument('--queries', type=int, default=1000, help='queries per kind')
+	p.add_argument('--vocabulary', type=int, default=20000, help='number of distinct words in the synthetic sentences')
+	p.add_argument('--threshold', type=float, default=0.8)
+	p.set_defaults(func=translation_memory)
+
+	p = subparsers.add_parser('decoder_cache', help='translation time with an empty, a filled and a reopened decoder cache')
+	p.add_argument('--model', required=True, help='model directory in models/')
+	p.add_argument('--direction', required=True, help='e.g. de_hsb')
+	p.add_argument('--text', required=True, help='document to translate')
+	p.set_defaults(func=decoder_cache)
+
+	p = subparsers.add_parser('protected_patterns', help='tokenization with compiled protected patterns against sacremoses')
+	p.add_argument('--patterns', default='nonbreaking_prefixes/protected_pattern', help='protected pattern file')
+	p.add_argument('--basic', action='store_true', help='add the sacremoses BASIC_PROTECTED_PATTERNS (URLs, e-mail, XML tags)')
+	p.add_argument('--text', help='regression corpus, one sentence per line (default: synthetic sentences)')
+	p.add_argument('--sentences', type=int, default=2000, help='number of synthetic sentences')
+	p.add_argument('--repeat', type=int, default=5)
+	p.set_defaults(func=protected_patterns)
+
+	p = subparsers.add_parser('nbest', help='translation time with several hypotheses and scores per sentence')
+	p.add_argument('--model', required=True, help='model directory in models/')
+	p.add_argument('--direction', required=True, help='e.g. de_hsb')
+	p.add_argument('--text', required=True, help='document to translate')
+	p.add_argument('--hypotheses', type=int, nargs='+', default=[1, 2, 5])
+	p.add_argument('--repeat', type=int, default=3)
+	p.set_defaults(func=nbest)
+
+	p = subparsers.add_parser('pivot', help='pivot direction against two chained translations')
+	p.add_argument('--direction', required=True, help='pivot direction from model_config.yaml, e.g. cs_de')
+	p.add_argument('--text', required=True, help='document to translate')
+	p.add_argument('--repeat', type=int, default=3)
+	p.set_defaults(func=pivot)
+
+	args = parser.parse_args()
+	args.func(args)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+# Persistenter Cache für Ergebnisse des Decoders, in einer SQLite-Datenbank im WAL-Modus. Die Datei kann von mehreren
+# waitress-Instanzen und Containern auf einem Host gleichzeitig benutzt werden und übersteht Neustarts.
+#
+# Schlüssel ist ein Hash aus Modellname, Version des Modells, Decoding-Profil und der vorverarbeiteten Eingabe (BPE-Tokens
+# mit Platzhaltern); gespeichert wird die beste Hypothese als BPE-Tokens, die Nachbearbeitung (Detokenisierung,
+# Platzhalter) läuft bei einem Treffer wie nach dem Decoding.
+#
+# Ändert sich ein Modell (model_info.yaml, z.B. traindate, oder die Größe einer Modelldatei), ändern sich damit alle seine
+# Schlüssel. Laufen während eines Deploys oder Neuladens beide Versionen gleichzeitig, bekommt jede nur ihre eigenen
+# Einträge. Einträge alter Versionen werden nicht mehr gelesen und als erste gelöscht, sobald die Datenbank größer als
+# max_bytes wird: dann werden die am längsten nicht benutzten Einträge gelöscht, bis sie wieder auf 90% von max_bytes passt.
+# Treffer werden im Speicher gesammelt und mit dem nächsten Schreiben als benutzt gespeichert, spätestens nach
+# used_interval Sekunden; ein Lesen wartet also nicht bei jedem Treffer auf die Schreibsperre der Datenbank.
+
+import sqlite3, hashlib, threading, time
+
+# Größe nur bei jedem check_interval-ten Schreiben prüfen
+check_interval = 100
+# Sekunden, nach denen gesammelte Treffer spätestens als benutzt gespeichert werden
+used_interval = 60
+
+
+def cache_key(model, version, profile, tokens):
+	return hashlib.blake2b('\0'.join((model, version, profile, ' '.join(tokens))).encode('utf-8'), digest_size=16).digest()
+
+
+class decoder_cache:
+
+	def __init__(self, path, max_bytes):
+		self.path = path
+		self.max_bytes = max_bytes
+		self.lock = threading.Lock()
+		self.writes = 0
+		# key -> Zeitpunkt des letzten Treffers, noch nicht gespeichert
+		self.used = dict()
+		self.used_flushed = time.time()
+		self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+		self.connection.execute('PRAGMA journal_mode=WAL')
+		self.connection.execute('PRAGMA synchronous=NORMAL')
+		self.connection.execute('PRAGMA busy_timeout=5000')
+		self.connection.execute('CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, model TEXT NOT NULL, hypothesis TEXT NOT NULL, used REAL NOT NULL) WITHOUT ROWID')
+		self.connection.execute('CREATE INDEX IF NOT EXISTS entries_used ON entries (used)')
+		self.connection.execute('CREATE INDEX IF NOT EXISTS entries_model ON entries (model)')
+
+	def get(self, keys):
+		"""Gibt {key: [BPE-Token]} für die gefundenen Schlüssel zurück und markiert sie als benutzt."""
+		if not keys: return dict()
+		placeholders = ','.join('?' * len(keys))
+		with self.lock:
+			found = {key: hypothesis.split(' ') for key, hypothesis in self.connection.execute(
+				f'SELECT key, hypothesis FROM entries WHERE key IN ({placeholders})', keys)}
+			now = time.time()
+			self.used.update((key, now) for key in found)
+			if self.used and now - self.used_flushed >= used_interval:
+				self.used_flushed = now
+				try:
+					self.connection.execute('BEGIN')
+					self._flush_used()
+					self.connection.execute('COMMIT')
+				except sqlite3.Error:
+					# davon hängt nur die Reihenfolge der Verdrängung ab; die Treffer bleiben für das nächste Schreiben gesammelt
+					if self.connection.in_transaction: self.connection.execute('ROLLBACK')
+		return found
+
+	def put(self, model, items):
+		"""Speichert (key, [BPE-Token])-Paare."""
+		if not items: return
+		now = time.time()
+		with self.lock:
+			self.connection.execute('BEGIN')
+			try:
+				self.connection.executemany('INSERT OR REPLACE INTO entries (key, model, hypothesis, used) VALUES (?, ?, ?, ?)',
+											[(key, model, ' '.join(tokens), now) for key, tokens in items])
+				self._flush_used()
+				self.writes += 1
+				if self.writes % check_interval == 0: self._evict()
+				self.connection.execute('COMMIT')
+			except BaseException:
+				# sonst bleibt die Verbindung in der Transaktion hängen und jedes weitere BEGIN schlägt fehl
+				if self.connection.in_transaction: self.connection.execute('ROLLBACK')
+				raise
+
+	def _flush_used(self):
+		# unter self.lock; Treffer seit dem letzten Aufruf als benutzt speichern
+		if self.used:
+			self.connection.executemany('UPDATE entries SET used = max(used, ?) WHERE key = ?', [(used, key) for key, used in self.used.items()])
+			self.used.clear()
+		self.used_flushed = time.time()
+
+	def size(self):
+		page_size, page_count, freelist_count = (self.connection.execute(f'PRAGMA {name}').fetchone()[0] for name in ('page_size', 'page_count', 'freelist_count'))
+		return (page_count - freelist_count) * page_size
+
+	def _evict(self):
+		# unter self.lock in der Transaktion von put; gelöschte Seiten werden von SQLite wiederverwendet, die Datei wächst also nicht weiter
+		size = self.size()
+		if size <= self.max_bytes: return
+		count = self.connection.execute('SELECT count(*) FROM entries').fetchone()[0]
+		excess = 1 - 0.9 * self.max_bytes / size
+		self.connection.execute('DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY used LIMIT ?)', (max(1, int(count * excess)),))
+
+	def status(self):
+		with self.lock:
+			return { "entries": self.connection.execute('SELECT count(*) FROM entries').fetchone()[0], "bytes": self.size(), "max_bytes": self.max_bytes }
@@ -1,26 +1,26 @@
-from .handling_ph_mark import set_markers as set_markers_ph_mark, remove_markers as remove_markers_ph_mark
-from .handling_named_entitiy_id import set_markers as set_markers_neid, remove_markers as remove_markers_neid
+from pipeline.ph_mark import set_markers as set_markers_ph_mark, remove_markers as remove_markers_ph_mark, strip_markers
+from .handling_named_entitiy_id import set_markers as set_markers_neid, remove_markers as remove_markers_neid, get_extractor as get_extractor_neid
 
+# markers ist die Rückübersetzungsinformation der jeweiligen Methode (Liste bei ph_mark, mapping aus marker-Objekten
+# bei named_entitiy_id, sonst None) und wird unverändert an unset_markers weitergegeben
 def set_markers(text, method, ne_placeholder_separator):
     if method == "ph_mark":
-        text_marked, maps = set_markers_ph_mark(text)
-        markers_information = {"maps": maps}
+        return set_markers_ph_mark(text)
     elif method == "named_entitiy_id":
-        text_marked, mapping = set_markers_neid(text, ne_placeholder_separator)
-        markers_information = {"mapping": mapping}
-    else:
-        text_marked = text
-        markers_information = {}
-
-    return text_marked, markers_information
+        return set_markers_neid(text, ne_placeholder_separator)
+    return text, None
 
-def unset_markers(text_marked, method, markers_information, ne_placeholder_separator):
+def unset_markers(text_marked, method, markers, ne_placeholder_separator):
     if method == "ph_mark":
-        text = remove_markers_ph_mark(text_marked, markers_information["maps"])
+        text = strip_markers(remove_markers_ph_mark(text_marked, markers))
     elif method == "named_entitiy_id":
-        text = remove_markers_neid(text_marked, markers_information["mapping"], ne_placeholder_separator)
+        text = remove_markers_neid(text_marked, markers, ne_placeholder_separator)
     else:
         text = text_marked
     return text
 
-__all__ = ["set_markers", "unset_markers"]
\ No newline at end of file
+def prepare():
+    # Lädt, was die Platzhalter-Methoden erst bei der ersten Anfrage bräuchten
+    get_extractor_neid()
+
+__all__ = ["set_markers", "unset_markers", "prepare"]
\ No newline at end of file
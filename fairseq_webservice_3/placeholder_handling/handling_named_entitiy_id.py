@@ -72,29 +72,53 @@ ESC_L = "╠"  # pseudo-escaped left marker
 ESC_R = "╣"  # pseudo-escaped right marker
 
 
-extractor = URLExtract()
-extractor.update_when_older(7)
+class marker:
+    """Originaltext eines Platzhalters; __slots__ statt eines dict pro Platzhalter."""
+    __slots__ = ('text', 'space_before', 'space_after')
+
+    def __init__(self, text: str, space_before: bool = False, space_after: bool = False):
+        self.text = text
+        self.space_before = space_before
+        self.space_after = space_after
+
+    def __repr__(self):
+        return f"marker({self.text!r}, space_before={self.space_before}, space_after={self.space_after})"
+
+
+_extractor = None
+
+def get_extractor() -> URLExtract:
+    """
+    Erzeugt den URLExtract erst bei Bedarf: update_when_older lädt ggf. die TLD-Liste
+    aus dem Netz und soll den Import (und damit den Start des Webservice) nicht blockieren.
+    """
+    global _extractor
+    if _extractor is None:
+        extractor = URLExtract()
+        extractor.update_when_older(7)
+        _extractor = extractor
+    return _extractor
 
 def check_url_urlextract(text):
-    urls = extractor.find_urls(text)
+    urls = get_extractor().find_urls(text)
     if len(urls) > 0 and urls[0] == text:
         return True
     else:
         return False
 
 
-def set_markers(text: str, ne_placeholder_separator: Optional[str]=None) -> Tuple[str, Dict[str, Dict[str, Any]]]:
+def set_markers(text: str, ne_placeholder_separator: Optional[str]=None) -> Tuple[str, Dict[str, marker]]:
     """
     Ersetzt URLs, Domains, E-Mails, Zahlenfolgen und nicht-lateinische Sequenzen
     durch interne NE-Marker der Form ├<type>:<id>┤.
-    Gibt (marked_text, mapping) zurück, wobei mapping[id] = {'text': original, 'type': type}.
+    Gibt (marked_text, mapping) zurück, wobei mapping[id] = marker(original, space_before, space_after).
     """
     # ---------- 1) Pseudo-Escaping vorhandener NE-Marker ----------
     # Ersetze vorhandene "├" / "┤" durch ähnliche Zeichen, die nicht als Marker interpretiert werden.
     text_ps = text.replace("├", ESC_L).replace("┤", ESC_R)
 
     # ---------- Hilfsdaten ----------
-    mapping: Dict[str, str] = {}
+    mapping: Dict[str, marker] = {}
     used_ids = set()  # ids chosen so far (strings)
     # Sammle alle reinen Ziffernfolgen aus dem pseudo-escaped Text -> diese IDs vermeiden
     banned_digit_sequences = set(re.findall(r"\d+", text_ps))
@@ -326,11 +350,7 @@ def set_markers(text: str, ne_placeholder_separator: Optional[str]=None) -> Tupl
             orig = item['text']
             # hole id, die nicht bereits im Text vorkommt (banned_digit_sequences berücksichtigt)
             nid = next_id()
-            mapping[nid] = {
-                "text": orig,
-                "space_before": item.get("space_before", False),
-                "space_after": item.get("space_after", False),
-            }
+            mapping[nid] = marker(orig, item.get("space_before", False), item.get("space_after", False))
             out.append(f"├{nid}┤")
         else:
             out.append(item['text'])
@@ -358,7 +378,7 @@ def remove_markers(text_with_markers: str,
 
     Args:
         text_with_markers: Text, der Marker wie 3 enthält.
-        mapping: Dict, das pro id die Originalsequenz liefert: mapping["3"] = "https://...",
+        mapping: Dict, das pro id die Originalsequenz liefert: mapping["3"] = marker("https://...", ...) oder "https://...",
 
     Returns:
         restored_text: Text, in dem alle Marker durch ihre Originalsequenzen ersetzt wurden
@@ -371,12 +391,12 @@ def remove_markers(text_with_markers: str,
             print(f"ID '{id_str}' not found in mapping.")
             return None  # caller will decide to leave unchanged
         val = mapping[id_str]
-        if isinstance(val, dict):
-            text = val.get("text", "")
-            if val.get("space_before", False):
+        if isinstance(val, marker):
+            text = val.text
+            if val.space_before:
                 text = " " + text
             if not interpunction_after:
-                if val.get("space_after", False):
+                if val.space_after:
                     text = text + " "
             else:
                 text = text + interpunction_after
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+# Geschützte Muster (protected patterns) für den MosesTokenizer, einmal pro Datei kompiliert.
+#
+# MosesTokenizer.tokenize(..., protected_patterns=[...]) kompiliert bei jedem Satz jedes Muster neu, sucht jedes Muster
+# einzeln und ersetzt bzw. restauriert jeden Treffer mit einem eigenen str.replace über den ganzen Text. Hier werden alle
+# Muster einer Datei zu einer Alternation kompiliert; Ersetzen und Restaurieren sind je ein re.sub. Die Platzhalter
+# (Marker + dreistellige Nummer) und die Grenze von 1000 Treffern sind dieselben wie in sacremoses, die Tokenisierung
+# bleibt also gleich (Vergleich: benchmark.py protected_patterns).
+#
+# Die Datei wird von allen Modellen mit demselben protected_pattern_filepath geteilt und nur einmal gelesen.
+
+import os, re, threading
+from functools import lru_cache
+
+# wie MosesTokenizer.MAX_PROTECTED_TOKENS; mehr passen nicht in die dreistellige Nummer
+max_protected_tokens = 1000
+
+_patterns = dict()
+_lock = threading.Lock()
+
+
+@lru_cache(maxsize=16)
+def restore_regex(marker):
+	return re.compile(re.escape(marker) + r'(\d{3})')
+
+
+class protected_patterns:
+
+	def __init__(self, patterns):
+		# leere Zeilen würden an jeder Position treffen
+		self.patterns = [pattern for pattern in patterns if pattern]
+		self.regex = re.compile('|'.join(f'(?:{pattern})' for pattern in self.patterns), re.IGNORECASE)
+
+	def tokenize(self, tokenizer, text, aggressive_dash_splits=False, escape=True):
+		"""Wie tokenizer.tokenize(text, ..., protected_patterns=self.patterns, return_str=False)."""
+		# wie in MosesTokenizer.tokenize vor dem Suchen der Muster; im Tokenizer ändern die beiden Schritte danach nichts mehr
+		for regexp, substitution in (tokenizer.DEDUPLICATE_SPACE, tokenizer.ASCII_JUNK):
+			text = regexp.sub(substitution, str(text))
+		# neuere sacremoses-Versionen wählen einen Marker, der im Text nicht vorkommt
+		marker = tokenizer.unused_protect_marker(text) if hasattr(tokenizer, 'unused_protect_marker') else 'THISISPROTECTED'
+		tokens = []
+
+		def protect(match):
+			if not match.group(): return ''
+			tokens.append(match.group())
+			return marker + str(len(tokens) - 1).zfill(3)
+
+		text = self.regex.sub(protect, text)
+		if len(tokens) > max_protected_tokens:
+			raise ValueError(f'too many protected tokens: {len(tokens)} matches exceeds the limit of {max_protected_tokens}')
+		text = tokenizer.tokenize(text, aggressive_dash_splits=aggressive_dash_splits, escape=escape, return_str=True)
+		if tokens:
+			# sacremoses restauriert vor dem XML-Escaping; das Escaping wirkt zeichenweise, also vorher auf die Treffer anwenden
+			if escape: tokens = [tokenizer.escape_xml(token) for token in tokens]
+			text = restore_regex(marker).sub(lambda m: tokens[int(m.group(1))] if int(m.group(1)) < len(tokens) else m.group(), text)
+		return text.split()
+
+
+def load(filename):
+	"""Gibt die (geteilten) kompilierten Muster aus filename zurück."""
+	key = os.path.abspath(filename)
+	with _lock:
+		if key not in _patterns:
+			with open(filename, encoding='utf-8') as f:
+				_patterns[key] = protected_patterns([line.strip() for line in f])
+		return _patterns[key]
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+# Translation Memory: übersetzte Sätze werden pro Modell (und Decoding-Profil) und Richtung in einer SQLite-Datenbank
+# gespeichert, zusammen mit der Version des Modells. Vor dem Übersetzen wird jeder Satz nachgeschlagen:
+# - exakter Treffer: die gespeicherte Übersetzung wird ohne Decoding zurückgegeben
+# - ähnlicher Satz (Ähnlichkeit >= threshold): optional wird seine Übersetzung als Hinweis für den Decoder verwendet
+#   (target_prefix, siehe CTranslator.py)
+#
+# Für die unscharfe Suche bekommt jeder Satz eine MinHash-Signatur über seine Wörter, die in bands Teile zerlegt und
+# gehasht wird (Locality Sensitive Hashing). Kandidaten sind Einträge, die in mindestens einem Teil übereinstimmen; das
+# sind auch bei Millionen Einträgen nur wenige Index-Zugriffe. Unter den Kandidaten entscheidet die Ähnlichkeit der
+# Wortfolgen (difflib).
+#
+# Einträge einer anderen Version des Modells (neu trainiert oder ausgetauscht unter demselben Namen) werden nicht
+# gefunden; wird der Satz mit der aktuellen Version übersetzt, ersetzt die neue Übersetzung den alten Eintrag. So sind
+# die Einträge auch richtig, wenn während eines Deploys Container mit beiden Versionen dieselbe Datei benutzen.
+#
+# Wird die Datenbank größer als max_bytes, werden wie im Decoder-Cache (decoder_cache.py) die am längsten nicht benutzten
+# Einträge samt ihren bands gelöscht, bis sie wieder auf 90% von max_bytes passt. Benutzt-Zeitpunkte werden im Speicher
+# gesammelt und mit dem nächsten Schreiben gespeichert, spätestens nach used_interval Sekunden, damit Suchen nicht
+# bei jedem Treffer auf die Schreibsperre der Datenbank warten müssen.
+
+import re, sqlite3, hashlib, random, threading, time
+from difflib import SequenceMatcher
+
+BANDS, ROWS = 8, 4
+MASK64 = (1 << 64) - 1
+# multiply-shift-Hashfunktionen für die MinHash-Signatur, fest geseedet, damit alle Prozesse dieselben Signaturen berechnen
+_random = random.Random(20240809)
+PERMUTATIONS = [(_random.getrandbits(64) | 1, _random.getrandbits(64)) for _ in range(BANDS * ROWS)]
+word_pattern = re.compile(r'\w+')
+# Größe nur bei jedem check_interval-ten Schreiben prüfen
+check_interval = 100
+# Sekunden, nach denen gesammelte Treffer spätestens als benutzt gespeichert werden
+used_interval = 60
+
+
+def stable_hash(text):
+	return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def band_keys(namespace, words):
+	hashes = [stable_hash(word) for word in set(words)]
+	if not hashes: return []
+	signature = [min(((a * h + b) & MASK64) >> 32 for h in hashes) for a, b in PERMUTATIONS]
+	# SQLite-INTEGER sind vorzeichenbehaftet
+	return [stable_hash(f'{namespace}\t{band}\t{signature[band * ROWS:(band + 1) * ROWS]}') - (1 << 63) for band in range(BANDS)]
+
+
+def common_prefix_length(a, b):
+	n = 0
+	for x, y in zip(a, b):
+		if x != y: break
+		n += 1
+	return n
+
+
+class match:
+	"""
+	Ergebnis einer Suche. prefix_words ist die geschätzte Anzahl Wörter am Anfang der Übersetzung, die auch für den
+	gesuchten Satz stimmen: anteilig zu den übereinstimmenden Wörtern am Satzanfang, mit einem Wort Sicherheitsabstand.
+	"""
+	__slots__ = ('source', 'translation', 'similarity', 'exact', 'prefix_words')
+
+	def __init__(self, source, translation, similarity, exact, prefix_words):
+		self.source = source
+		self.translation = translation
+		self.similarity = similarity
+		self.exact = exact
+		self.prefix_words = prefix_words
+
+
+def estimate_prefix_words(sentence, source, translation, min_words):
+	sentence_words, source_words = sentence.split(), source.split()
+	common = common_prefix_length(sentence_words, source_words)
+	if common < min_words: return 0
+	return max(0, len(translation.split()) * common // len(source_words) - 1)
+
+
+class translation_memory:
+
+	def __init__(self, path, max_bytes, threshold=0.8, candidates=50, min_words=3):
+		self.path = path
+		self.max_bytes = max_bytes
+		self.threshold = threshold
+		self.candidates = candidates
+		# kürzere Sätze werden nur exakt gesucht; MinHash über ein, zwei Wörter ist zu ungenau
+		self.min_words = min_words
+		self.lock = threading.Lock()
+		self.writes = 0
+		# id -> Zeitpunkt des letzten Treffers, noch nicht gespeichert
+		self.used = dict()
+		self.used_flushed = time.time()
+		self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+		self.connection.execute('PRAGMA journal_mode=WAL')
+		self.connection.execute('PRAGMA synchronous=NORMAL')
+		# mehrere Prozesse (waitress-Instanzen, Container) können dieselbe Datei verwenden
+		self.connection.execute('PRAGMA busy_timeout=5000')
+		self.connection.execute('CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, model TEXT NOT NULL, direction TEXT NOT NULL, '
+								'source TEXT NOT NULL, translation TEXT NOT NULL, version TEXT NOT NULL DEFAULT \'\', used REAL NOT NULL DEFAULT 0, '
+								'UNIQUE (model, direction, source))')
+		columns = [row[1] for row in self.connection.execute('PRAGMA table_info(entries)')]
+		# Dateien von vor der Versionierung: ihre Einträge haben keine Version und werden nach und nach ersetzt
+		if not 'version' in columns:
+			self.connection.execute("ALTER TABLE entries ADD COLUMN version TEXT NOT NULL DEFAULT ''")
+		# Dateien von vor der Größenbegrenzung: ihre Einträge gelten als am längsten nicht benutzt
+		if not 'used' in columns:
+			self.connection.execute('ALTER TABLE entries ADD COLUMN used REAL NOT NULL DEFAULT 0')
+		self.connection.execute('CREATE INDEX IF NOT EXISTS entries_used ON entries (used)')
+		self.connection.execute('CREATE TABLE IF NOT EXISTS bands (key INTEGER NOT NULL, entry INTEGER NOT NULL)')
+		self.connection.execute('CREATE INDEX IF NOT EXISTS bands_key ON bands (key)')
+		# zum Löschen der bands verdrängter Einträge
+		self.connection.execute('CREATE INDEX IF NOT EXISTS bands_entry ON bands (entry)')
+
+	def __len__(self):
+		with self.lock:
+			return self.connection.execute('SELECT count(*) FROM entries').fetchone()[0]
+
+	def lookup(self, model, version, direction, sentences):
+		"""Gibt für jeden Satz einen match (exakt oder ähnlich genug) aus Einträgen dieser version oder None zurück."""
+		results = [None] * len(sentences)
+		used = dict()
+		with self.lock:
+			exact = {source: (id, translation) for id, source, translation in self.connection.execute(
+				f'SELECT id, source, translation FROM entries WHERE model = ? AND direction = ? AND version = ? AND source IN ({",".join("?" * len(sentences))})',
+				[model, direction, version, *sentences])} if sentences else dict()
+			for i, sentence in enumerate(sentences):
+				if sentence in exact:
+					id, translation = exact[sentence]
+					results[i], used[i] = match(sentence, translation, 1.0, True, 0), id
+					continue
+				words = word_pattern.findall(sentence.lower())
+				if len(words) < self.min_words: continue
+				keys = band_keys(f'{model}\t{direction}', words)
+				# Modell, Richtung und Version vor dem LIMIT filtern, sonst können Einträge anderer Versionen alle Plätze belegen.
+				# CROSS JOIN: SQLite soll von den bands ausgehen und nicht alle Einträge des Modells durchsuchen
+				candidates = self.connection.execute(
+					f'SELECT DISTINCT entries.id, source, translation FROM bands CROSS JOIN entries ON entries.id = bands.entry '
+					f'WHERE key IN ({",".join("?" * len(keys))}) AND model = ? AND direction = ? AND version = ? LIMIT ?',
+					[*keys, model, direction, version, self.candidates]).fetchall()
+				for id, source, translation in candidates:
+					source_words = word_pattern.findall(source.lower())
+					similarity = SequenceMatcher(None, words, source_words, autojunk=False).ratio()
+					if similarity >= self.threshold and (results[i] is None or similarity > results[i].similarity):
+						results[i], used[i] = match(source, translation, similarity, False, estimate_prefix_words(sentence, source, translation, self.min_words)), id
+			now = time.time()
+			self.used.update((id, now) for id in used.values())
+			if self.used and now - self.used_flushed >= used_interval:
+				self.used_flushed = now
+				try:
+					self.connection.execute('BEGIN')
+					self._flush_used()
+					self.connection.execute('COMMIT')
+				except sqlite3.Error:
+					# davon hängt nur die Reihenfolge der Verdrängung ab; die Treffer bleiben für das nächste Schreiben gesammelt
+					if self.connection.in_transaction: self.connection.execute('ROLLBACK')
+		return results
+
+	def add(self, model, version, direction, pairs):
+		"""Speichert (Satz, Übersetzung)-Paare; schon vorhandene Sätze bleiben unverändert, außer sie stammen von einer anderen version."""
+		namespace = f'{model}\t{direction}'
+		rows = [(source, translation, band_keys(namespace, word_pattern.findall(source.lower()))) for source, translation in pairs]
+		now = time.time()
+		with self.lock:
+			self.connection.execute('BEGIN')
+			try:
+				for source, translation, keys in rows:
+					cursor = self.connection.execute('INSERT OR IGNORE INTO entries (model, direction, source, translation, version, used) VALUES (?, ?, ?, ?, ?, ?)',
+													 (model, direction, source, translation, version, now))
+					if cursor.rowcount == 1:
+						self.connection.executemany('INSERT INTO bands (key, entry) VALUES (?, ?)', [(key, cursor.lastrowid) for key in keys])
+					else:
+						# die bands hängen nur an Modell, Richtung und Satz und bleiben gültig
+						self.connection.execute('UPDATE entries SET translation = ?, version = ?, used = ? WHERE model = ? AND direction = ? AND source = ? AND version != ?',
+												(translation, version, now, model, direction, source, version))
+				self._flush_used()
+				self.writes += 1
+				if self.writes % check_interval == 0: self._evict()
+				self.connection.execute('COMMIT')
+			except BaseException:
+				self.connection.execute('ROLLBACK')
+				raise
+
+	def _flush_used(self):
+		# unter self.lock; Treffer seit dem letzten Aufruf als benutzt speichern
+		if self.used:
+			self.connection.executemany('UPDATE entries SET used = max(used, ?) WHERE id = ?', [(used, id) for id, used in self.used.items()])
+			self.used.clear()
+		self.used_flushed = time.time()
+
+	def size(self):
+		page_size, page_count, freelist_count = (self.connection.execute(f'PRAGMA {name}').fetchone()[0] for name in ('page_size', 'page_count', 'freelist_count'))
+		return (page_count - freelist_count) * page_size
+
+	def _evict(self):
+		# unter self.lock in der Transaktion von add; gelöschte Seiten werden von SQLite wiederverwendet
+		size = self.size()
+		if size <= self.max_bytes: return
+		count = self.connection.execute('SELECT count(*) FROM entries').fetchone()[0]
+		excess = 1 - 0.9 * self.max_bytes / size
+		limit = self.connection.execute('SELECT used FROM entries ORDER BY used LIMIT 1 OFFSET ?', (max(1, int(count * excess)) - 1,)).fetchone()
+		if limit is None: return
+		self.connection.execute('DELETE FROM bands WHERE entry IN (SELECT id FROM entries WHERE used <= ?)', limit)
+		self.connection.execute('DELETE FROM entries WHERE used <= ?', limit)
+
+	def status(self):
+		with self.lock:
+			return { "entries": self.connection.execute('SELECT count(*) FROM entries').fetchone()[0], "bytes": self.size(), "max_bytes": self.max_bytes }
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+# Kompakter, memory-mapped Index über train_vocabulary.txt für die Berechnung der unks.
+#
+# Statt pro Modell ein Python-set mit hunderttausenden str-Objekten zu halten, wird das Vokabular einmal in eine
+# Indexdatei geschrieben (UTF-8-Wörter, Offset-Array und Hash-Tabelle) und per mmap eingeblendet. Modelle mit identischem
+# Vokabular teilen sich eine Indexdatei und ein mmap; Prozesse (waitress-Instanzen, Container mit gemeinsamem
+# VOCABULARY_INDEX_DIR) teilen sich die Seiten im Page Cache.
+#
+# Dateiformat: MAGIC, uint32 n, uint32 m, (n+1) uint32 Offsets, m uint32 Hash-Slots, n UTF-8-Wörter (ohne Trenner)
+#
+# Die Hash-Slots sind eine offen adressierte Tabelle (lineares Sondieren, höchstens halb voll) mit dem Index des Worts
+# bzw. EMPTY; Hashfunktion ist zlib.crc32, die in allen Prozessen gleich ist (anders als hash()). Ein Lookup ist damit
+# ein crc32 und meist ein einziger Vergleich von Bytes statt einer binären Suche mit ~20 Vergleichen in Python.
+# Davor liegt ein dict mit den Ergebnissen für die zuletzt nachgeschlagenen Wörter (höchstens cache_size): Wörter aus
+# Anfragen wiederholen sich stark, und ein Treffer kostet so viel wie im set.
+
+import os, mmap, hashlib, tempfile, threading, zlib
+from array import array
+
+MAGIC = b'VOCIDX2\n'
+EMPTY = 0xFFFFFFFF
+cache_size = int(os.environ.get('VOCABULARY_CACHE_SIZE', 50000))
+index_dir = os.environ.get('VOCABULARY_INDEX_DIR', os.path.join(tempfile.gettempdir(), 'vocabulary_index'))
+
+_indexes = dict()
+_lock = threading.Lock()
+
+
+def file_digest(filename):
+	digest = hashlib.sha256()
+	with open(filename, 'rb') as f:
+		for chunk in iter(lambda: f.read(1 << 20), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+def build_index(vocabulary_file, index_file):
+	# gleiche Wortliste wie früher set(open(...).read().split('\n'))
+	with open(vocabulary_file, encoding='utf-8') as f:
+		words = sorted(set(word.encode('utf-8') for word in f.read().split('\n')))
+	offsets = array('I', [0])
+	for word in words:
+		offsets.append(offsets[-1] + len(word))
+	size = 8
+	while size < 2 * len(words): size *= 2
+	slots = array('I', [EMPTY]) * size
+	for ix, word in enumerate(words):
+		slot = zlib.crc32(word) & (size - 1)
+		while slots[slot] != EMPTY: slot = (slot + 1) & (size - 1)
+		slots[slot] = ix
+	# erst in eine temporäre Datei schreiben und dann umbenennen, damit parallel startende Prozesse keinen halben Index sehen
+	fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(index_file))
+	with os.fdopen(fd, 'wb') as f:
+		f.write(MAGIC)
+		f.write(array('I', [len(words), size]).tobytes())
+		f.write(offsets.tobytes())
+		f.write(slots.tobytes())
+		f.write(b''.join(words))
+	os.replace(tmp_file, index_file)
+
+
+class vocabulary_index:
+	"""Read-only Menge von Wörtern auf Basis einer memory-mapped Indexdatei; unterstützt `in` und len()."""
+
+	def __init__(self, index_file):
+		with open(index_file, 'rb') as f:
+			self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		if not self.mm[:len(MAGIC)] == MAGIC:
+			raise ValueError(f'{index_file} is not a vocabulary index')
+		view = memoryview(self.mm)
+		start = len(MAGIC) + 8
+		self.n, size = view[len(MAGIC):start].cast('I')
+		self.mask = size - 1
+		self.offsets = view[start:start + 4 * (self.n + 1)].cast('I')
+		start += 4 * (self.n + 1)
+		self.slots = view[start:start + 4 * size].cast('I')
+		self.words_start = start + 4 * size
+		self.cache = dict()
+
+	def __len__(self):
+		return self.n
+
+	def __contains__(self, word):
+		known = self.cache.get(word)
+		return self._remember(word) if known is None else known
+
+	def _remember(self, word):
+		# ohne Lock: ein doppelt berechnetes oder nach clear() fehlendes Ergebnis ist harmlos
+		if len(self.cache) >= cache_size: self.cache.clear()
+		known = self.cache[word] = self._lookup(word)
+		return known
+
+	def _lookup(self, word):
+		key = word.encode('utf-8')
+		mm, offsets, slots, mask, base = self.mm, self.offsets, self.slots, self.mask, self.words_start
+		slot = zlib.crc32(key) & mask
+		while True:
+			ix = slots[slot]
+			if ix == EMPTY: return False
+			if mm[base + offsets[ix]:base + offsets[ix + 1]] == key: return True
+			slot = (slot + 1) & mask
+
+	def unknown_words(self, words):
+		cache, unknown = self.cache, []
+		for word in words:
+			known = cache.get(word)
+			if known is None: known = self._remember(word)
+			if not known: unknown.append(word)
+		return unknown
+
+
+def load(vocabulary_file):
+	"""Gibt den (geteilten) vocabulary_index für vocabulary_file zurück; baut die Indexdatei beim ersten Mal."""
+	digest = file_digest(vocabulary_file)
+	with _lock:
+		if not digest in _indexes:
+			index_file = os.path.join(index_dir, digest + '.vocidx2')
+			if not os.path.exists(index_file):
+				os.makedirs(index_dir, exist_ok=True)
+				build_index(vocabulary_file, index_file)
+			_indexes[digest] = vocabulary_index(index_file)
+		return _indexes[digest]
@@ -0,0 +1,16 @@
+#!/bin/bash
+# Übersetzt die Moses-Eingabe von stdin und schreibt die detokenisierten Übersetzungen nach stdout. Moses gibt jeden
+# Satz aus, sobald er übersetzt ist; detokenizer.perl (-b) und sed (-u) puffern nicht, damit /translate_stream die
+# Sätze einzeln weitergeben kann.
+
+SRC_LANG=$1
+DST_LANG=$2
+
+./mosesdecoder/bin/moses -f ./smt/$SRC_LANG-$DST_LANG/moses.ini \
+	--mark-unknown \
+	--unknown-word-prefix '<unk>' \
+	--unknown-word-suffix '</unk>' \
+	-placeholder-factor 1 \
+	-xml-input exclusive | \
+
+./mosesdecoder/scripts/tokenizer/detokenizer.perl -a -q -b | sed -u -E 's/^[[:punct:]]*[[:alpha:]]/\U&/; s/<unk>/ <unk>/gi'
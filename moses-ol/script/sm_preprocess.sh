@@ -0,0 +1,17 @@
+#!/bin/bash
+# Vorverarbeitung für Moses: liest den Text von stdin und schreibt einen Satz pro Zeile (Moses-Eingabe) nach stdout.
+# Die Sätze mit Strukturmarkern (¶ Zeilenende, ┊ Satzende) gehen nach $3 (siehe main_splitsentences.pl).
+
+SRC_LANG=$1
+DST_LANG=$2
+
+FILE_SRC_SENTENCE_OUTPUT=$3
+
+sed 's/\r$//' | \
+${MT_SCRIPTS}/main_splitsentences.pl in $SRC_LANG $FILE_SRC_SENTENCE_OUTPUT | \
+./mosesdecoder/scripts/tokenizer/normalize-punctuation.perl -l $SRC_LANG | \
+./mosesdecoder/scripts/tokenizer/tokenizer.perl -q -a -no-escape -l $SRC_LANG | \
+sed -E 's|\b([[:alpha:]]+?) @\-@ li\b|\1-li|g' | \
+./mosesdecoder/scripts/recaser/truecase.perl --model ./smt/$SRC_LANG-$DST_LANG/truecase-model.$SRC_LANG | \
+${MT_SCRIPTS}/ph_nes.pl | \
+./mosesdecoder/scripts/generic/ph_numbers.perl
@@ -1,5 +1,5 @@
 import flask
-from flask import request, jsonify, send_file
+from flask import request, jsonify, send_file, Response, stream_with_context
 #from flask_cors import CORS
 import os
 import subprocess
@@ -13,6 +13,8 @@ import subprocess
 
 import logging
 import sys
+import signal
+import io
 
 
 
@@ -32,7 +34,7 @@ def delete_temp_files(files):
     print ("length is ",len(files))
     for file in files:
         print("File: "+file)
-        exec(f"rm {file}")
+        exec(f"rm -f {file}")
     
 
 def exec(cmd):
@@ -75,6 +77,102 @@ def err_msg(msg):
     return {"errormsg": msg}
 
 
+# Strukturmarker von main_splitsentences.pl (¶ Zeilenende, ┊ Satzende, ?? unbekannt)
+newline_marker = "¶"
+sentence_marker = "┊"
+unknown_marker = "??"
+
+pipeline_outputs = ["src_sentence_output", "src_moses", "dst_translation_raw", "dst_sentence_result"]
+
+
+def check_languages(src_lng, trg_lng):
+    if src_lng == '' or trg_lng == '':
+        return err_msg('"source_language" or "targetlanguage" field in JSON payload is required')
+
+    if not ((src_lng == 'de' and trg_lng == 'hsb') or (src_lng == 'hsb' and trg_lng == 'de')):
+        return err_msg('only \'de\' and \'hsb\' as translation language supported!')
+    return None
+
+
+def temp_files(names):
+    return {name: f"./tmp/temp_file_{name}_{uuid.uuid4().hex}.txt" for name in names}
+
+
+def file_lines(data):
+    # wie readlines(), aber nur an "\n" getrennt (str.splitlines trennt auch an \u2028 usw.)
+    lines = data.split("\n")
+    return [line + "\n" for line in lines[:-1]] + ([lines[-1]] if lines[-1] else [])
+
+
+def end_marker(marked_sentence):
+    # wie main_splitsentences.pl out
+    if marked_sentence.endswith(newline_marker):
+        return newline_marker
+    if marked_sentence.endswith(sentence_marker):
+        return sentence_marker
+    return unknown_marker
+
+
+def run_pipeline(text, src_lng, trg_lng):
+    """Übersetzt text mit sm_translate.sh und gibt die vier Ausgabedateien als Strings zurück."""
+    files = temp_files(["in"] + pipeline_outputs)
+    try:
+        writeStringToFile(text, files["in"])
+
+        # sm_translate.sh de hsb ./tmp/in.txt ./tmp/src_sentence_output.txt ./tmp/src_moses.txt ./tmp/dst_translation_raw.txt ./tmp/dst_sentence_result.txt
+        exec (f"./script/sm_translate.sh {src_lng} {trg_lng} " + " ".join(files[name] for name in ["in"] + pipeline_outputs))
+
+        return {name: readFileIntoString(files[name]) for name in pipeline_outputs}
+    finally:
+        delete_temp_files(list(files.values()))
+
+
+def document_boundaries(src_sentence_output, documents):
+    """Zeilenbereiche (start, end) der Dokumente in den Ausgabedateien eines gemeinsamen Laufs.
+
+    Jede nicht leere Eingabezeile endet in src_sentence_output mit genau einer Zeile mit ¶ (leere Zeilen erzeugen keine
+    Ausgabe), die Dokumente werden also an den ¶-Zeilen getrennt. None, wenn die Anzahl nicht passt."""
+    lines = file_lines(src_sentence_output)
+    ends = [ix + 1 for ix, line in enumerate(lines) if line.rstrip("\n").endswith(newline_marker)]
+    counts = [sum(1 for line in document.split("\n") if line.strip()) for document in documents]
+    if len(ends) != sum(counts) or (ends and ends[-1] != len(lines)) or (not ends and lines):
+        return None
+
+    boundaries = []
+    start = 0
+    seen = 0
+    for count in counts:
+        seen += count
+        end = ends[seen - 1] if count else start
+        boundaries.append((start, end))
+        start = end
+    return boundaries
+
+
+def exception_msg(ex):
+    trace = []
+    tb = ex.__traceback__
+    while tb is not None:
+        trace.append(
+            {
+                "filename": tb.tb_frame.f_code.co_filename,
+                "name": tb.tb_frame.f_code.co_name,
+                "lineno": tb.tb_lineno,
+            }
+        )
+        tb = tb.tb_next
+    ret = {
+        "errormsg": "Exception",
+        "exception": {
+            "type": type(ex).__name__,
+            "message": str(ex),
+            "trace": trace,
+        },
+    }
+    logging.info("Exception: " + str(ret))
+    return ret
+
+
 @app.route("/translate", methods=["POST"])
 def translate():
     logging.info(str(request))
@@ -90,64 +188,107 @@ def translate():
         text = request.json.get('text')
         src_lng = request.json.get('source_language', '')
         trg_lng = request.json.get('target_language', '')
-        if src_lng == '' or trg_lng == '':
-             return err_msg('"source_language" or "targetlanguage" field in JSON payload is required')
+        error = check_languages(src_lng, trg_lng)
+        if error is not None:
+            return error
 
-        if not ((src_lng == 'de' and trg_lng == 'hsb') or (src_lng == 'hsb' and trg_lng == 'de')):
-             return err_msg('only \'de\' and \'hsb\' as translation language supported!')
+        return run_pipeline(text, src_lng, trg_lng)
 
+    except Exception as ex:
+        return exception_msg(ex)
 
-        temp_file_in = f"./tmp/temp_file_in_{uuid.uuid4().hex}.txt"
-        temp_file_src_sentence_output = f"./tmp/temp_file_src_sentence_output_{uuid.uuid4().hex}.txt"
-        temp_file_src_moses = f"./tmp/temp_file_src_moses_{uuid.uuid4().hex}.txt"
-        temp_file_dst_translation_raw = f"./tmp/temp_file_dst_translation_raw_{uuid.uuid4().hex}.txt"
-        temp_file_dst_sentence_result = f"./tmp/temp_file_dst_sentence_result_{uuid.uuid4().hex}.txt"
-       
 
-        writeStringToFile(text, temp_file_in)
+@app.route("/translate_batch", methods=["POST"])
+def translate_batch():
+    """Übersetzt mehrere Dokumente mit einem Lauf der Pipeline (Moses lädt das Modell nur einmal).
 
+    Eingabe: {"documents": ["...", ...], "source_language": ..., "target_language": ...}
+    Ausgabe: {"results": [...]} mit denselben Feldern wie /translate pro Dokument."""
+    logging.info(str(request))
+    logging.info("request json payload: " + str(request.json))
 
-        # sm_translate.sh de hsb ./tmp/in.txt ./tmp/src_sentence_output.txt ./tmp/src_moses.txt ./tmp/dst_translation_raw.txt ./tmp/dst_sentence_result.txt
-        exec (f"./script/sm_translate.sh {src_lng} {trg_lng} {temp_file_in} {temp_file_src_sentence_output} {temp_file_src_moses} {temp_file_dst_translation_raw} {temp_file_dst_sentence_result}")
+    try:
+        if request.json is None or not isinstance(request.json.get('documents'), list):
+            return err_msg('"documents" field (list of texts) in JSON payload is required')
 
-        src_sentence_output = readFileIntoString(temp_file_src_sentence_output)
-        src_moses = readFileIntoString(temp_file_src_moses)
-        dst_translation_raw = readFileIntoString(temp_file_dst_translation_raw)
-        dst_sentence_result = readFileIntoString(temp_file_dst_sentence_result)
+        documents = request.json.get('documents')
+        if not all(isinstance(document, str) for document in documents):
+            return err_msg('"documents" must be a list of strings')
+        src_lng = request.json.get('source_language', '')
+        trg_lng = request.json.get('target_language', '')
+        error = check_languages(src_lng, trg_lng)
+        if error is not None:
+            return error
+        if not documents:
+            return {"results": []}
+
+        # "\r" wird in sm_preprocess.sh ohnehin entfernt; so zählen Zeilen in der Eingabe wie in der Pipeline
+        documents = [document.replace("\r\n", "\n") for document in documents]
+        output = run_pipeline("\n".join(documents), src_lng, trg_lng)
+        boundaries = document_boundaries(output["src_sentence_output"], documents)
+        if boundaries is None:
+            return err_msg('could not assign the translated sentences to the documents')
+
+        lines = {name: file_lines(output[name]) for name in pipeline_outputs}
+        return {"results": [{name: "".join(lines[name][start:end]) for name in pipeline_outputs} for start, end in boundaries]}
 
+    except Exception as ex:
+        return exception_msg(ex)
 
-        files=[]
-        files.append(temp_file_in)
-        files.append(temp_file_src_sentence_output)
-        files.append(temp_file_src_moses)
-        files.append(temp_file_dst_translation_raw)
-        files.append(temp_file_dst_sentence_result)
-        delete_temp_files(files)
 
-        return {"src_sentence_output": src_sentence_output, "src_moses": src_moses,  "dst_translation_raw": dst_translation_raw, "dst_sentence_result": dst_sentence_result}
+@app.route("/translate_stream", methods=["POST"])
+def translate_stream():
+    """Wie /translate, gibt die Übersetzung aber Satz für Satz aus, sobald Moses sie liefert (NDJSON, eine Zeile pro Satz):
+    {"index": ..., "src_sentence": Satz mit Strukturmarker, "translation": Übersetzung mit Strukturmarker}.
+    Bei einem Fehler ist die letzte Zeile {"errormsg": ...}."""
+    logging.info(str(request))
+    logging.info("request json payload: " + str(request.json))
+
+    try:
+        if request.json is None or 'text' not in request.json:
+            return err_msg('"text" field in JSON payload is required')
+
+        text = request.json.get('text')
+        src_lng = request.json.get('source_language', '')
+        trg_lng = request.json.get('target_language', '')
+        error = check_languages(src_lng, trg_lng)
+        if error is not None:
+            return error
+
+        files = temp_files(["in", "src_sentence_output", "src_moses"])
+        try:
+            writeStringToFile(text, files["in"])
+            # die Vorverarbeitung ist schnell; Moses bekommt die fertige Eingabe und die Strukturmarker liegen vollständig vor
+            exec(f"cat {files['in']} | ./script/sm_preprocess.sh {src_lng} {trg_lng} {files['src_sentence_output']} >{files['src_moses']}")
+            sentences = [line.rstrip("\n") for line in file_lines(readFileIntoString(files["src_sentence_output"]))]
+        except Exception:
+            delete_temp_files(list(files.values()))
+            raise
 
     except Exception as ex:
-        trace = []
-        tb = ex.__traceback__
-        while tb is not None:
-            trace.append(
-                {
-                    "filename": tb.tb_frame.f_code.co_filename,
-                    "name": tb.tb_frame.f_code.co_name,
-                    "lineno": tb.tb_lineno,
-                }
-            )
-            tb = tb.tb_next
-        ret = {
-            "errormsg": "Exception",
-            "exception": {
-                "type": type(ex).__name__,
-                "message": str(ex),
-                "trace": trace,
-            },
-        }
-        logging.info("Exception: " + str(ret))
-        return ret
+        return exception_msg(ex)
+
+    def generate():
+        # eigene Prozessgruppe, damit bei einem Abbruch durch den Client auch Moses beendet wird
+        process = subprocess.Popen(f"./script/sm_decode.sh {src_lng} {trg_lng} <{files['src_moses']}", shell=True,
+                                   stdout=subprocess.PIPE, start_new_session=True)
+        try:
+            for ix, line in enumerate(io.TextIOWrapper(process.stdout, encoding='utf-8')):
+                src_sentence = sentences[ix] if ix < len(sentences) else ""
+                yield json.dumps({"index": ix, "src_sentence": src_sentence,
+                                  "translation": line.rstrip("\n") + end_marker(src_sentence)}, ensure_ascii=False) + "\n"
+            if process.wait() != 0:
+                yield json.dumps(err_msg(f"decoder exited with status {process.returncode}")) + "\n"
+        finally:
+            if process.poll() is None:
+                os.killpg(process.pid, signal.SIGTERM)
+                process.wait()
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    # beim Schließen der Antwort, also auch wenn der Client abbricht, bevor generate() gestartet ist;
+    # ein laufendes generate() wird vorher geschlossen und beendet Moses
+    response.call_on_close(lambda: delete_temp_files(list(files.values())))
+    return response
 
 
 if __name__ == "__main__":
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+
+# Gemeinsame Bibliothek der Übersetzungsdienste (fairseq_webservice_3, ctranslate-ol, sotra-lsf-ds): Normalisierung,
+# Platzhalter (ph_mark), BPE, Zulassungskontrolle (admission), Versionsverwaltung und die Schritte der Pipeline mit
+# Messung (stages). Alle Schritte arbeiten auf Listen von Sätzen. Die Module mit Abhängigkeiten (bpe: youtokentome,
+# ph_mark: urlextract) importiert das Paket selbst nicht; das tun die Dienste, die sie verwenden, beim Start (ph_mark
+# legt dabei den URLExtract an und prüft die Platzhalter an einem Testsatz).
+#
+# Die Dockerfiles der Dienste kopieren das Verzeichnis aus einem eigenen Build-Kontext, z.B.
+#   docker build --build-context pipeline=../pipeline -t fairseq_webservice_3 .
+
+from .stages import stage, status, tokenize, detokenize, translate, collect, timed, count
+from .version import set_version
+
+__all__ = ["stage", "status", "tokenize", "detokenize", "translate", "collect", "timed", "count", "set_version"]
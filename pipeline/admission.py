@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+# Zulassungskontrolle für /translate, damit große Dokumente (bulk) die Anfragen aus der GUI (interactive) nicht aufhalten.
+#
+# - Anfragen werden nach Textlänge in die Spuren interactive und bulk eingeteilt; mit dem Header X-Priority: bulk kann
+#   ein Client kleine Anfragen selbst als bulk markieren. Texte über interactive_max_chars sind immer bulk.
+# - Übersetzt wird nur in einem von slots Übersetzer-Slots. Freie Slots gehen immer zuerst an wartende interaktive
+#   Anfragen; bulk darf höchstens bulk_slots Slots gleichzeitig belegen, der Rest bleibt für interactive frei.
+# - Pro Client sind höchstens client_limit Anfragen gleichzeitig zugelassen (429), pro Spur höchstens max_queue
+#   wartende oder laufende Anfragen (503). Beide Fehler kommen sofort und mit einer geschätzten Retry-After-Zeit.
+
+import heapq, itertools, math, threading, time
+from contextlib import contextmanager
+
+# Reihenfolge = Priorität
+LANES = ('interactive', 'bulk')
+
+
+class rejected(Exception):
+	"""Anfrage wird nicht zugelassen; status ist der HTTP-Statuscode, retry_after die geschätzte Wartezeit in Sekunden."""
+
+	def __init__(self, status, message, retry_after):
+		super().__init__(message)
+		self.status = status
+		self.retry_after = retry_after
+
+
+class admission_control:
+
+	def __init__(self, slots, bulk_slots, max_queue, client_limit, interactive_max_chars):
+		if slots < 1 or not 0 < bulk_slots <= slots:
+			raise ValueError(f'invalid slots {slots} / bulk_slots {bulk_slots}')
+		self.slots = slots
+		self.capacity = {'interactive': slots, 'bulk': bulk_slots}
+		self.max_queue = max_queue
+		self.client_limit = client_limit
+		self.interactive_max_chars = interactive_max_chars
+		self.lock = threading.Lock()
+		self.waiting = []  # Heap aus (Priorität, Reihenfolge, Spur, Event)
+		self.order = itertools.count()
+		self.busy = {lane: 0 for lane in LANES}
+		self.queued = {lane: 0 for lane in LANES}
+		self.clients = dict()
+		# gleitender Mittelwert der Bearbeitungsdauer pro Spur, für Retry-After
+		self.seconds = {lane: 1.0 for lane in LANES}
+
+	def classify(self, priority, length):
+		if priority == 'bulk' or length > self.interactive_max_chars:
+			return 'bulk'
+		return 'interactive'
+
+	def retry_after(self, lane):
+		return max(1, math.ceil(self.seconds[lane] * (self.queued[lane] + 1) / self.capacity[lane]))
+
+	@contextmanager
+	def admit(self, client, lane):
+		"""Lässt eine Anfrage von client in lane zu oder wirft rejected."""
+		with self.lock:
+			if self.clients.get(client, 0) >= self.client_limit:
+				raise rejected(429, f'too many concurrent requests (limit {self.client_limit})', self.retry_after(lane))
+			if self.queued[lane] >= self.max_queue[lane]:
+				raise rejected(503, f'too many {lane} requests, try again later', self.retry_after(lane))
+			self.clients[client] = self.clients.get(client, 0) + 1
+			self.queued[lane] += 1
+		start = time.monotonic()
+		try:
+			yield
+		finally:
+			with self.lock:
+				self.seconds[lane] = 0.8 * self.seconds[lane] + 0.2 * (time.monotonic() - start)
+				self.queued[lane] -= 1
+				self.clients[client] -= 1
+				if not self.clients[client]: del self.clients[client]
+
+	def _dispatch(self):
+		# unter self.lock: Slots in der Reihenfolge des Heaps vergeben; ein wartendes bulk steht immer hinter allen interactive
+		while self.waiting:
+			_, _, lane, event = self.waiting[0]
+			if sum(self.busy.values()) >= self.slots or self.busy[lane] >= self.capacity[lane]: break
+			heapq.heappop(self.waiting)
+			self.busy[lane] += 1
+			event.set()
+
+	@contextmanager
+	def slot(self, lane):
+		"""Wartet auf einen Übersetzer-Slot für lane."""
+		event = threading.Event()
+		with self.lock:
+			heapq.heappush(self.waiting, (LANES.index(lane), next(self.order), lane, event))
+			self._dispatch()
+		event.wait()
+		try:
+			yield
+		finally:
+			with self.lock:
+				self.busy[lane] -= 1
+				self._dispatch()
+
+	def status(self):
+		with self.lock:
+			return { "slots": self.slots, "busy": dict(self.busy), "queued": dict(self.queued), "waiting": len(self.waiting) }
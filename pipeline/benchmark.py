@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+# Benchmarks der einzelnen Pipeline-Schritte. Jeder Schritt wird einmal Satz für Satz (eine Liste mit einem Satz pro
+# Aufruf, wie bisher in den Diensten) und einmal mit dem ganzen Batch aufgerufen; verglichen werden Zeit pro Satz und
+# Ausgabe. Aufruf im Verzeichnis über pipeline/, z.B.
+#   python -m pipeline.benchmark normalize [--text dokument.de]
+#   python -m pipeline.benchmark ph_mark [--text dokument.hsb]
+#   python -m pipeline.benchmark tokenize --language hsb [--text dokument.hsb]
+#   python -m pipeline.benchmark bpe --codes fairseq_webservice_3/models/2024-08-09_de2hsb/codes-yttm [--text dokument.de]
+# Ohne --text werden synthetische Sätze verwendet.
+
+import argparse, random, timeit
+
+import pipeline
+
+
+def read_sentences(args):
+	if args.text:
+		with open(args.text, encoding='utf-8') as f:
+			return [line.strip() for line in f if line.strip()]
+	random.seed(0)
+	words = ['Serbske', 'słowo', 'Wörter', 'je', 'a', 'to', 'z', 'wjele', 'der', 'die', 'und', 'Budyšin', 'Chóśebuz', 'dźěło',
+			 'z.B.', '5,300', '„Zitat“', 'info@serbja.de', 'https://www.sorbisch.de', 'Brücke', 'ﬁnden', ',', '-']
+	return [' '.join(random.choice(words) for _ in range(random.randint(3, 30))) + '.' for _ in range(args.sentences)]
+
+
+def compare(name, run, sentences, number):
+	"""run(batch) ruft den Schritt mit einer Liste auf; gemessen wird pro Satz und mit allen Sätzen."""
+	single = lambda: [run([sentence])[0] for sentence in sentences]
+	batch = lambda: run(sentences)
+	identical = single() == list(batch())
+	single_seconds = min(timeit.repeat(single, number=1, repeat=number)) / len(sentences)
+	batch_seconds = min(timeit.repeat(batch, number=1, repeat=number)) / len(sentences)
+	print(f"{name:<14}{len(sentences):>10}{single_seconds*1e6:>12.1f}{batch_seconds*1e6:>12.1f}{single_seconds/batch_seconds:>9.2f}  {identical}")
+
+
+def normalize(args, sentences):
+	from pipeline.normalization import normalize
+	compare('normalize', normalize, sentences, args.repeat)
+
+
+def ph_mark(args, sentences):
+	from pipeline.ph_mark import mark, unmark
+	compare('ph_mark', mark, sentences, args.repeat)
+	marked = mark(sentences)
+	compare('ph_unmark', lambda batch: unmark([sentence for sentence, _ in batch], [maps for _, maps in batch]), marked, args.repeat)
+
+
+def tokenize(args, sentences):
+	from sacremoses import MosesTokenizer, MosesDetokenizer
+	tokenizer, detokenizer = MosesTokenizer(args.language), MosesDetokenizer(args.language)
+	compare('tokenize', lambda batch: pipeline.tokenize(batch, lambda sentence: tokenizer.tokenize(sentence, escape=False)), sentences, args.repeat)
+	tokens = pipeline.tokenize(sentences, lambda sentence: tokenizer.tokenize(sentence, escape=False))
+	compare('detokenize', lambda batch: pipeline.detokenize(batch, detokenizer.detokenize), tokens, args.repeat)
+
+
+def bpe(args, sentences):
+	import youtokentome as yttm
+	from pipeline import bpe
+	model = yttm.BPE(model=args.codes)
+	tokens = [sentence.split() for sentence in sentences]
+	compare('bpe_encode', lambda batch: bpe.encode(batch, model), tokens, args.repeat)
+	compare('bpe_decode', bpe.decode, bpe.encode(tokens, model), args.repeat)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('stage', choices=['normalize', 'ph_mark', 'tokenize', 'bpe'])
+	parser.add_argument('--text', help='sentences, one per line (default: synthetic sentences)')
+	parser.add_argument('--sentences', type=int, default=5000, help='number of synthetic sentences')
+	parser.add_argument('--repeat', type=int, default=5)
+	parser.add_argument('--language', default='hsb', help='tokenizer language (tokenize)')
+	parser.add_argument('--codes', help='youtokentome model, e.g. codes-yttm of a model directory (bpe)')
+	args = parser.parse_args()
+	if args.stage == 'bpe' and not args.codes: parser.error('bpe needs --codes')
+
+	sentences = read_sentences(args)
+	print(f"{'stage':<14}{'sentences':>10}{'single µs':>12}{'batch µs':>12}{'speedup':>9}  identical")
+	globals()[args.stage](args, sentences)
+	print(pipeline.status())
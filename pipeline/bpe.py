@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+# BPE-Schritte (youtokentome). encode kodiert alle Sätze eines Batches mit einem Aufruf; youtokentome verteilt die
+# Sätze dabei auf mehrere Threads, statt pro Satz einen eigenen Aufruf zu machen.
+
+import youtokentome as yttm
+
+from .stages import stage
+
+
+def bpe_detokenize(tokens):
+	return ''.join(tokens).replace('▁', ' ').strip().split()
+
+
+encode = stage('bpe_encode', lambda sentences, bpe: bpe.encode([' '.join(tokens) for tokens in sentences], output_type=yttm.OutputType.SUBWORD) if sentences else [])
+decode = stage('bpe_decode', lambda hypotheses: [bpe_detokenize(hypothesis) for hypothesis in hypotheses])
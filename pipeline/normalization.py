@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+# Normalisierung der Eingabetexte vor dem Satzsplitting. Alle Tabellen und Muster werden einmal beim Import erzeugt.
+# Jeder Schritt wird nur ausgeführt, wenn der Text betroffene Zeichen enthält; die Prüfungen mit `in` und die
+# Ersetzungen mit str.replace laufen in C und sind deutlich schneller als str.translate mit nicht-ASCII-Tabellen.
+
+import re
+
+from .stages import stage
+
+# NO-BREAK SPACE (U+00A0) wird zum Leerzeichen; SOFT HYPHEN (U+00AD); ZERO WIDTH SPACE (U+200B); \r verwirrt bisweilen die Übersetzer ...
+char_replacements = (('\u00A0', ' '), ('\u00AD', ''), ('\u200B', ''), ('\r', ''))
+spaces_pattern = re.compile(r"[ \t]+")
+
+# zerlegte Umlaute (Vokal + COMBINING DIAERESIS U+0308) und Ligaturen, in einem Durchgang ersetzt.
+# unicodedata.normalize('NFC'/'NFKC') wäre nicht gleichwertig, weil es auch alle anderen Zeichen normalisiert.
+replacements = {
+	'A\u0308': 'Ä', 'O\u0308': 'Ö', 'U\u0308': 'Ü', 'a\u0308': 'ä', 'o\u0308': 'ö', 'u\u0308': 'ü',
+	'ﬀ': 'ff', 'ﬁ': 'fi', 'ﬂ': 'fl', 'ﬅ': 'ft',
+}
+replacements_pattern = re.compile('|'.join(map(re.escape, replacements)))
+replacements_triggers = ('\u0308', 'ﬀ', 'ﬁ', 'ﬂ', 'ﬅ')
+
+def replace_match(match):
+	return replacements[match.group()]
+
+def prepareTranslationInputText(text):
+	for f, r in char_replacements:
+		if f in text:
+			text = text.replace(f, r)
+	if '\t' in text or '  ' in text:
+		text = spaces_pattern.sub(' ', text)
+	if ' \n' in text:
+		text = text.replace(' \n', '\n')
+	if any(trigger in text for trigger in replacements_triggers):
+		text = replacements_pattern.sub(replace_match, text)
+	return text
+
+def get_words(tokens):
+	return set(token.replace('.', '') for token in tokens if not token.isnumeric())
+
+def add_words(words, tokens):
+	# wie get_words, aber ohne ein eigenes set pro Satz
+	words.update(token.replace('.', '') for token in tokens if not token.isnumeric())
+
+normalize = stage('normalize', lambda texts: [prepareTranslationInputText(text) for text in texts])
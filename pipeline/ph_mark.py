@@ -1,7 +1,12 @@
+# Platzhalter-Methode ph_mark: URLs, E-Mail-Adressen, Hashtags, Emojis und Anführungszeichen werden durch '⟦⟧' ersetzt
+# und nach der Übersetzung in der ursprünglichen Reihenfolge wieder eingesetzt.
+
 from urlextract import URLExtract
 import sys
 import re
 
+from .stages import stage
+
 
 extractor = URLExtract()
 for l, r in ('„','“'), ('‚','‘'), ('(', ')'), (' ', '.'), (' ', '?'), (' ', '!'), (' ', ','), (' ', ')'):
@@ -55,10 +60,13 @@ def remove_markers(sentence, maps):
 			sentence = sentence.replace(PH_MARK + ' ', map[0], 1)
 		else:
 			sentence = sentence.replace(PH_MARK, map, 1)
+	return sentence
 
-	sentence = sentence.translate(str.maketrans('', '', PH_MARK))
+# übrig gebliebene Platzhalter entfernen; ctranslate-ol tut das erst nach dem Abschneiden des angehängten Punkts
+strip_table = str.maketrans('', '', PH_MARK)
 
-	return sentence
+def strip_markers(sentence):
+	return sentence.translate(strip_table)
 
 teststring = 'Abo sće hižo raz wo wužiwanju „dźěćacych pytanskich mašinow“ kaž blinde-kuh.de a fragFINN.de pod sylko.freudenberg@stadt.kamenz.de přemyslował/a?'
 try:
@@ -70,4 +78,7 @@ try:
 except AssertionError as e:
 	eprint('Platzhalter passen nicht!')
 	eprint(set_markers(teststring))
-	sys.exit(1)
\ No newline at end of file
+	sys.exit(1)
+
+mark = stage('ph_mark', lambda sentences: [set_markers(sentence) for sentence in sentences])
+unmark = stage('ph_unmark', lambda sentences, maps: [remove_markers(sentence, sentence_maps) for sentence, sentence_maps in zip(sentences, maps)])
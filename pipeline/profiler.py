@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+# Sampling-Profiler für den laufenden Dienst (/debug/profile). Ein Aufruf nimmt einige Sekunden lang in festen Abständen
+# die Python-Stacks aller anderen Threads (waitress- bzw. Flask-Threads, Lade-Threads) mit sys._current_frames() auf und
+# gibt sie im collapsed-Format zurück, das flamegraph.pl, speedscope und inferno direkt lesen:
+#   thread;äußerste Funktion;...;innerste Funktion Anzahl
+# Pro Probe werden nur die Code-Objekte der Stacks gezählt, die Namen erst am Ende gebildet; die Threads selbst werden
+# nicht angehalten oder instrumentiert. Zeit in C-Erweiterungen (CTranslate2, youtokentome) zählt zur aufrufenden
+# Python-Funktion.
+#
+# Aktiv nur, wenn PROFILER_MAX_SECONDS gesetzt ist (> 0); längere Profile werden darauf begrenzt. Es läuft höchstens ein
+# Profil gleichzeitig.
+
+import os, re, sys, threading, time
+from collections import Counter
+
+max_seconds = float(os.environ.get('PROFILER_MAX_SECONDS', 0))
+default_interval = float(os.environ.get('PROFILER_INTERVAL', 0.01))
+min_interval = 0.001
+
+# Threads, deren innerste Python-Funktion eine dieser ist, warten nur (auf Anfragen, Sockets, Locks) und werden ohne
+# idle=1 nicht gezählt. Wartezeit auf einen Übersetzer-Slot (admission) erscheint damit ebenfalls nicht.
+idle_functions = {'wait', 'select', 'poll', 'accept', '_wait_for_tstate_lock', 'handle_read', 'readinto'}
+
+_lock = threading.Lock()
+
+
+def frame_name(code):
+	return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ':')
+
+
+def thread_name(name):
+	# waitress-3, Thread-12 (...) usw. zusammenfassen
+	return re.sub(r'\d+', 'N', name).replace(';', ':')
+
+
+def collapsed_stacks(seconds, interval=default_interval, idle=False):
+	"""Nimmt seconds lang alle interval Sekunden die Stacks der anderen Threads auf; None, wenn schon ein Profil läuft."""
+	if not _lock.acquire(blocking=False): return None
+	try:
+		own = threading.get_ident()
+		samples = Counter()
+		end = time.perf_counter() + seconds
+		while time.perf_counter() < end:
+			names = {thread.ident: thread.name for thread in threading.enumerate()}
+			for ident, frame in sys._current_frames().items():
+				if ident == own or (not idle and frame.f_code.co_name in idle_functions): continue
+				codes = []
+				while frame is not None:
+					codes.append(frame.f_code)
+					frame = frame.f_back
+				samples[names.get(ident, 'unknown'), tuple(codes)] += 1
+			time.sleep(interval)
+
+		names = dict()
+		lines = Counter()
+		for (name, codes), count in samples.items():
+			stack = [thread_name(name)] + [names.setdefault(code, frame_name(code)) for code in reversed(codes)]
+			lines[';'.join(stack)] += count
+		return ''.join(f'{stack} {count}\n' for stack, count in lines.most_common())
+	finally:
+		_lock.release()
+
+
+def profile_response(args):
+	"""Flask-Antwort für /debug/profile?seconds=..&interval=..&idle=1 (args: request.args)."""
+	if max_seconds <= 0: return { "errormsg": 'profiler is disabled (PROFILER_MAX_SECONDS)' }, 404
+	try:
+		seconds = min(max(float(args.get('seconds', 10)), 0), max_seconds)
+		interval = max(float(args.get('interval', default_interval)), min_interval)
+	except ValueError:
+		return { "errormsg": "'seconds' and 'interval' should be numbers" }, 400
+	stacks = collapsed_stacks(seconds, interval, idle=args.get('idle') == '1')
+	if stacks is None: return { "errormsg": 'a profile is already running' }, 409
+	return stacks, 200, { "Content-Type": "text/plain; charset=utf-8" }
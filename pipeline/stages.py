@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+# Verarbeitungsschritte der Übersetzungspipeline mit Messung. Ein stage bekommt eine Liste (Sätze, Token-Listen,
+# Hypothesen) und gibt eine gleich lange Liste zurück; weitere Argumente (Tokenizer, BPE-Modell, Translator, Optionen)
+# werden durchgereicht. Jeder Aufruf wird pro stage gezählt und gemessen, status() gibt die Summen für /status zurück.
+#
+# Für eine einzelne Anfrage (debug) sammelt collect() zusätzlich Zeiten und Batchgrößen aller stages, die im selben
+# Kontext laufen, sowie Blöcke mit timed(name) und Zähler mit count(name, n) für Schritte, die kein stage sind.
+
+import contextvars, threading, time
+from contextlib import contextmanager
+
+_stages = dict()
+
+
+class stage:
+
+	def __init__(self, name, function):
+		self.name = name
+		self.function = function
+		self.lock = threading.Lock()
+		self.calls = 0
+		self.items = 0
+		self.seconds = 0.0
+		_stages[name] = self
+
+	def __call__(self, items, *args, **kwargs):
+		start = time.perf_counter()
+		result = self.function(items, *args, **kwargs)
+		seconds = time.perf_counter() - start
+		with self.lock:
+			self.calls += 1
+			self.items += len(items)
+			self.seconds += seconds
+		stats = _request_stats.get()
+		if stats is not None:
+			stats.add(self.name, seconds)
+			stats.batches.setdefault(self.name, []).append(len(items))
+		return result
+
+	def status(self):
+		with self.lock:
+			return { "calls": self.calls, "items": self.items, "seconds": round(self.seconds, 3) }
+
+
+def status():
+	return {name: stage.status() for name, stage in _stages.items()}
+
+
+class request_stats:
+
+	def __init__(self):
+		self.seconds = dict()
+		self.counts = dict()
+		self.batches = dict()
+
+	def add(self, name, seconds):
+		self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+	def result(self):
+		return { "seconds": {name: round(seconds, 6) for name, seconds in self.seconds.items()}, "counts": self.counts, "batches": self.batches }
+
+
+_request_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+@contextmanager
+def collect():
+	"""Sammelt Zeiten, Zähler und Batchgrößen für alles, was im with-Block (im selben Thread) läuft."""
+	stats = request_stats()
+	token = _request_stats.set(stats)
+	try:
+		yield stats
+	finally:
+		_request_stats.reset(token)
+
+
+@contextmanager
+def timed(name):
+	stats = _request_stats.get()
+	if stats is None:
+		yield
+		return
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		stats.add(name, time.perf_counter() - start)
+
+
+def count(name, n):
+	stats = _request_stats.get()
+	if stats is not None: stats.counts[name] = stats.counts.get(name, 0) + n
+
+
+# Schritte, deren Werkzeug der Dienst mitbringt (sacremoses, mosestokenizer, ctranslate2): function wird pro Satz aufgerufen
+tokenize = stage('tokenize', lambda sentences, tokenize: [tokenize(sentence) for sentence in sentences])
+detokenize = stage('detokenize', lambda sentences, detokenize: [detokenize(tokens) for tokens in sentences])
+translate = stage('translate', lambda batch, translator, **options: translator.translate_batch(batch, **options))
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+import os, glob, datetime
+
+
+def set_version(vstore, source):
+	"""
+	Liest die Versionsnummer aus vstore und erhöht die letzte Stelle, wenn sich das Datum der letzten Änderung von source
+	(dem Skript des Dienstes) oder der Pipeline-Bibliothek geändert hat.
+	"""
+	version = open(vstore, 'r').readline()
+	v_num, v_date = version.split()
+	sources = [source, *glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))]
+	f_date = str(datetime.datetime.fromtimestamp(max(os.stat(f).st_mtime for f in sources))).split()[0]
+	if not v_date == f_date:
+		major, minor = v_num.rsplit('.', 1)
+		version = f'{major}.{int(minor) + 1} {f_date}'
+		with open(vstore, 'w') as f: f.write(version)
+	return version
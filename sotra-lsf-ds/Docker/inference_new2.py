@@ -7,6 +7,12 @@ import socket
 import json
 import os
 import re
+import threading
+import time
+from array import array
+
+import pipeline
+from pipeline import bpe, profiler
 
 
 version = "1.2.6 2025-12-17"
@@ -14,14 +20,51 @@ version = "1.2.6 2025-12-17"
 os.environ["MKL_CBWR"] = "AUTO,STRICT"
 #os.environ["MKL_CBWR"] = "COMPATIBLE"
 
+PILCROW_RUN = re.compile("¶+")
+
+
+class SentenceSegmentation:
+    """
+    Sätze eines Textes mit Strukturmarkern (¶ steht für das Ende eines Absatzes, ┊ für ein Satzende innerhalb eines Absatzes),
+    wie in Schnittstelle_Webserver_Translationscript.docx beschrieben.
+
+    Die markierten Sätze liegen "\n"-getrennt in einem einzigen String (marked); starts enthält den Offset jedes
+    markierten Satzes in marked und als letzten Eintrag len(marked) + 1.
+    """
+    __slots__ = ("marked", "starts")
+
+    def __init__(self, marked, starts):
+        self.marked = marked
+        self.starts = starts
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def marked_line(self, ix):
+        return self.marked[self.starts[ix]:self.starts[ix + 1] - 1]
+
+    def marked_lines(self):
+        return [self.marked_line(ix) for ix in range(len(self))]
+
+    def sentence(self, ix):
+        # der Satz ohne Marker, so wie er übersetzt wird
+        return self.marked_line(ix).replace("¶", "").replace("┊", "")
+
+    def end_marker(self, ix):
+        marked_line = self.marked_line(ix)
+        if marked_line.endswith("┊"):
+            return "┊"
+        if marked_line.endswith("¶"):
+            return PILCROW_RUN.search(marked_line).group() # kann auch eine Sequenz von Zeilenschaltungen sein (kann eigentlich nicht passieren ...)
+        return ""
+
+
 class FairseqCTranslateRunner:
 
     def __init__(self) -> None:
 
-        #self.verbose = 0
-        self.verbose = 1
-
-        self.debug_info = True # Es werden in der Response zusätzliche interne Datenausgaben der Translate-Pipeline zurückgeliefert
+        # VERBOSE=0 schaltet die Ausgaben der Zwischenergebnisse auf stdout ab
+        self.verbose = int(os.environ.get("VERBOSE", 1))
 
         self.modeldir = "models1/"
         self.modeldir1 = "lmu_ds_hsb_dsb_de_2022-02-02/"
@@ -53,12 +96,13 @@ class FairseqCTranslateRunner:
         #print(fname)
         #tt = ctranslate2.Translator(fname,    device="cpu") 
 
-        self.translator_default = { pair: ctranslate2.Translator(self.modeldir+self.modelpath_default.get(pair), device="cpu") for pair in self.modelpath_default  }
-
-        self.translator_test =    { pair: ctranslate2.Translator(self.modeldir+self.modelpath_test.get(pair),    device="cpu") for pair in self.modelpath_test  }
-
-        self.bpe_default= { pair: yttm.BPE(model = self.modeldir+self.modelpath_default.get(pair) + "codes-yttm") for pair in self.modelpath_default }
-        self.bpe_test= { pair: yttm.BPE(model = self.modeldir+self.modelpath_test.get(pair) + "codes-yttm") for pair in self.modelpath_test }
+        # Translator und BPE werden erst bei der ersten Anfrage pro (model_env, direction) geladen (siehe get_model).
+        # Zeigen mehrere Einträge auf denselben Modellpfad, teilen sie sich eine Instanz.
+        self.loaded_models = {}  # Modellpfad -> {"translator": ..., "bpe": ..., "last_used": ...}
+        self.loading_locks = {}  # Modellpfad -> Lock, damit ein Modell nicht von zwei Anfragen gleichzeitig geladen wird
+        self.models_lock = threading.Lock()
+        # Modelle, die nur in modelpath_test vorkommen, werden nach dieser Zeit (Sekunden) ohne Anfrage wieder freigegeben
+        self.test_model_idle_timeout = float(os.environ.get("TEST_MODEL_IDLE_TIMEOUT", 3600))
 
 
         self.tokenizer = {
@@ -84,67 +128,84 @@ class FairseqCTranslateRunner:
             "cs": SentenceSplitter(language='cs')
         }
 
+    def get_model(self, direction, model_env):
+        modelpath = self.modelpath_test if model_env == "test" else self.modelpath_default
+        path = self.modeldir + modelpath[direction]
+        with self.models_lock:
+            self.evict_idle_models()
+            loading_lock = self.loading_locks.setdefault(path, threading.Lock())
+        with loading_lock:
+            # get statt Prüfen und Lesen: fehlt das Modell (nie geladen oder inzwischen freigegeben), wird es hier geladen
+            loaded_model = self.loaded_models.get(path)
+            if loaded_model is None:
+                start = time.time()
+                loaded_model = {
+                    "translator": ctranslate2.Translator(path, device="cpu"),
+                    "bpe": yttm.BPE(model=path + "codes-yttm"),
+                }
+                self.loaded_models[path] = loaded_model
+                if self.verbose > 0:
+                    print("loaded model " + path + " in %.2fs" % (time.time() - start))
+            loaded_model["last_used"] = time.time()
+        return loaded_model
+
+    def evict_idle_models(self):
+        # laufende Anfragen halten ihre eigene Referenz auf Translator und BPE, die Freigabe betrifft nur neue Anfragen.
+        # Aufruf unter models_lock; Modelle, deren loading_lock gerade eine Anfrage hält, bleiben bis zum nächsten Aufruf.
+        default_paths = set(self.modeldir + path for path in self.modelpath_default.values())
+        now = time.time()
+        for path, loaded_model in list(self.loaded_models.items()):
+            if path in default_paths or now - loaded_model.get("last_used", now) <= self.test_model_idle_timeout:
+                continue
+            loading_lock = self.loading_locks.get(path)
+            if loading_lock is not None and not loading_lock.acquire(blocking=False):
+                continue
+            try:
+                self.loaded_models.pop(path, None)
+            finally:
+                if loading_lock is not None:
+                    loading_lock.release()
+            if self.verbose > 0:
+                print("released idle model " + path)
+
     def tokenize(self, text, src_lng):
         ret= self.tokenizer[src_lng].tokenize(text, aggressive_dash_splits=False, return_str=True, escape=False)
         return ret
 
 
-    def detokenize(self, text, trg_lng):
-        return self.detokenizer[trg_lng].detokenize(text.split())
-
-    def bpe_tokenize(self, text, direction, model_env):
-        bpe = self.bpe_default
-        if model_env == "test":
-            bpe = self.bpe_test
-        ret = bpe[direction].encode([text], output_type=yttm.OutputType.SUBWORD)
-        return ret[0]
-
-    def bpe_detokenize(self, text):
-        return ''.join(text.split()).replace('▁', ' ').strip()
-
     def add_language_token(self, text, trg_lng):
         return ["<" + trg_lng + ">"] + text
 
+    def segment(self, text, language):
+        """
+        Zerlegt text in einem Durchgang in Sätze mit Strukturmarkern (siehe SentenceSegmentation).
+        Jede Zeile wird (mit angehängtem ¶) an den SentenceSplitter gegeben; der letzte Satz einer Zeile endet auf ¶,
+        alle anderen bekommen ein ┊ angehängt.
+        """
+        splitter = self.sentence_splitter[language]
+        lines = text.replace("¶", "").split("\n")
+        if text.endswith("\n"):
+            lines.pop() # abschließender Zeilentrenner erzeugt keine zusätzliche (leere) Zeile
+        marked_lines = []
+        starts = array("I", [0])
+        for line in lines:
+            for item in splitter.split(line + "¶"):
+                marked_line = (item + "┊").replace("¶┊", "¶")
+                marked_lines.append(marked_line)
+                starts.append(starts[-1] + len(marked_line) + 1)
+        return SentenceSegmentation("\n".join(marked_lines), starts)
+
     def split_sentences(self, text, language):
-        #print("split_sentences: "+text)
-
-        if not text.endswith("\n"):
-                text = text+"\n" # abschließender Zeilentrenner ist für die weiteren Schritte Voraussetzung ...
-
-        # mark the sentences as described in Schnittstelle_Webserver_Translationscript.docx (¶ stands for newline (i. e. end of paragraph), ┊ stands for new sentence as part of a paragraph)
-        marked_lines = re.split("(\n)", text.replace("¶", "")) # keep the split delimiter ...
-        #print ("#0a: ",str(marked_lines))
-        marked_lines = [line.replace("\n", "¶") for line in marked_lines ]  # replace sequences \n+ by ¶+
-        #print ("#0b: ",str(marked_lines))
-        #print ("#1: ",("".join(marked_lines).replace("\n", "\\n")))
-        marked_lines1=[]
-        # marked_lines enthält abwechselnd die Zeileninhalte selbst und die Zeilentrennersequenzen ¶+. 
-        # In diesem Schritt werden Zeileninhalte und Zeilentrennersequenzen zusammengefügt
-        for i in range(0,len(marked_lines)-1,2):
-            if marked_lines[i] != "" or i < len(marked_lines)-1:
-                marked_lines1.append(marked_lines[i]+marked_lines[i+1])
-        #print ("#2: "+("".join(marked_lines1).replace("\n", "\\n")))
-
-        marked_lines  = marked_lines1
-        marked_lines = [self.sentence_splitter[language].split(
-            line) for line in marked_lines] # marked_lines ist jetzt ein Array of Arrays ...
-        #print ("marked_lines: "+str(marked_lines))
-        # flatten the list; ┊ stands for end of sentence
-        marked_lines = [
-            item + "┊" for sublist in marked_lines for item in sublist]
-        marked_lines = [line.replace("¶┊", "¶") for line in marked_lines]
-        #print("marked_lines: "+str(marked_lines))
-        return marked_lines
-
-    def translate(self, source, src_lng, trg_lng, model_env):
+        return self.segment(text, language).marked_lines()
+
+    def translate(self, source, src_lng, trg_lng, model_env, debug=False):
+        # debug: zusätzliche interne Datenausgaben der Translate-Pipeline (ctranslate2_input/ctranslate2_output) zurückliefern
         direction = src_lng + "_" + trg_lng
         modelpath = self.modelpath_default
-        translator = self.translator_default
         sentences_bpe_pp = ''  # bpe-encoded pretty print
         
         if model_env == "test":
             modelpath = self.modelpath_test
-            translator = self.translator_test
         model = ''
         errormsg = None
         output = None
@@ -162,74 +223,64 @@ class FairseqCTranslateRunner:
             marked_lines = [line.strip() for line in marked_lines] 
             source = "\n".join(marked_lines)
 
-            marked_lines=self.split_sentences(source, src_lng)
+            segmentation = self.segment(source, src_lng)
 
-            sentences = [line.replace("¶", "").replace("┊", "")
-                        for line in marked_lines]
+            sentences = [segmentation.sentence(ix) for ix in range(len(segmentation))]
 
+            sentences_tok = pipeline.tokenize(sentences, lambda sent: self.tokenize(sent, src_lng))
             if self.verbose > 0:
-                sentences_tok = [self.tokenize(sent, src_lng)
-                                for sent in sentences]
                 print("input: tokenized:\n", sentences_tok, "\n")
 
-            sentences = [self.add_language_token(self.bpe_tokenize(
-                self.tokenize(sent, src_lng), direction, model_env), trg_lng) for sent in sentences]
+            # BPE für alle Sätze mit einem Aufruf (siehe pipeline/bpe.py)
+            loaded_model = self.get_model(direction, model_env)
+            sentences_bpe = [self.add_language_token(sent, trg_lng)
+                             for sent in bpe.encode([sent.split() for sent in sentences_tok], loaded_model["bpe"])]
 
-            if self.verbose > 0 or self.debug_info:
-                sentences_bpe_pp = ["⚬".join(sent) for sent in sentences]
-                sentences_bpe_pp = "\n".join(sentences_bpe_pp)
-                sentences_bpe_pp = sentences_bpe_pp.replace("⚬▁", "▁")
+            if self.verbose > 0 or debug:
+                bpe_pp = "\n".join("⚬".join(sent) for sent in sentences_bpe).replace("⚬▁", "▁")
                 if self.verbose > 0:
                     print("input: tokenized / bpe result (pretty print):\n",
-                        sentences_bpe_pp, "\n")
+                        bpe_pp, "\n")
+                if debug:
+                    sentences_bpe_pp = bpe_pp
 
             translations = []
-            translations = translator[direction].translate_batch(
-                sentences, replace_unknowns=True, return_scores=False)
+            translations = pipeline.translate(sentences_bpe, loaded_model["translator"],
+                                              replace_unknowns=True, return_scores=False)
 
             translations_debpe_pp = ''
-            if self.verbose > 0 or self.debug_info:
+            if self.verbose > 0 or debug:
                 # if verbose > 0:
                 #    print("raw translations:", translations)
-                translations_debpe_pp = ["⚬".join(trans.hypotheses[0])
-                                         for trans in translations]
-                translations_debpe_pp = "\n".join(translations_debpe_pp)
-                translations_debpe_pp = translations_debpe_pp.replace(
-                    "⚬▁", "▁")
+                debpe_pp = "\n".join("⚬".join(trans.hypotheses[0])
+                                      for trans in translations).replace("⚬▁", "▁")
                 if self.verbose > 0:
                     print("raw translations (pretty print):\n",
-                          translations_debpe_pp, "\n")
-                    translations_tmp1 = [self.bpe_detokenize(
-                        " ".join(trans.hypotheses[0])) for trans in translations]
-                    print("translation bpe_detokenize:\n",
-                          translations_tmp1, "\n")
-                    translations_tmp2 = [self.detokenize(
-                        trans, trg_lng) for trans in translations_tmp1]
-                    print("translation detokenize:\n", translations_tmp2, "\n")
-
-            translations = [self.detokenize(self.bpe_detokenize(
-                " ".join(trans.hypotheses[0])), trg_lng) for trans in translations]
+                          debpe_pp, "\n")
+                if debug:
+                    translations_debpe_pp = debpe_pp
+
+            translations = bpe.decode([trans.hypotheses[0] for trans in translations])
+            if self.verbose > 0:
+                print("translation bpe_detokenize:\n",
+                      translations, "\n")
+            translations = pipeline.detokenize(translations, self.detokenizer[trg_lng].detokenize)
+            if self.verbose > 0:
+                print("translation detokenize:\n", translations, "\n")
 
             # if verbose > 0:
             #    print("translations; detokenize / bpe result:\n", translations, "\n")
 
             marked_translations = []
             for ix, translation in enumerate(translations):
-                marked_input_line = marked_lines[ix]
-                unmarked_input = marked_input_line.replace("¶", "").replace("┊", "")
-                if unmarked_input == "":
+                if sentences[ix] == "":
                     marked_translation = "" # Wenn die Eingabezeile leer war, dann lösche die Übersetzung (falls der Übersetzter halluzinierte ...)
                 else:
                     marked_translation = translation
-                end_marker = ""
-                if marked_input_line.endswith("┊"):
-                    end_marker = "┊"
-                elif marked_input_line.endswith("¶"):
-                    end_marker = re.split("(¶+)", marked_input_line)[1] # end_marker kann auch eine sequenz von Zeilenschaltungen sein (kann eigentlich nicht passieren ...)
-                marked_translations.append(marked_translation+end_marker)
+                marked_translations.append(marked_translation+segmentation.end_marker(ix))
 
             #print("#end:\n"+str(marked_translations))
-            marked_input = "\n".join(marked_lines)
+            marked_input = segmentation.marked
             output = " ".join(translations)
             marked_output = "\n".join(marked_translations)
         else:
@@ -251,6 +302,17 @@ if __name__ == "__main__":
 
     runner = FairseqCTranslateRunner()
 
+    # Zulassungskontrolle (siehe pipeline/admission.py); ein Dokument wird in einem Batch übersetzt und belegt dabei einen Slot
+    from pipeline.admission import admission_control, rejected
+    translation_slots = int(os.environ.get("TRANSLATION_SLOTS", 2))
+    admission = admission_control(
+        slots=translation_slots,
+        bulk_slots=int(os.environ.get("BULK_SLOTS", max(1, translation_slots - 1))),
+        max_queue={'interactive': int(os.environ.get("MAX_QUEUE_INTERACTIVE", 16)), 'bulk': int(os.environ.get("MAX_QUEUE_BULK", 8))},
+        client_limit=int(os.environ.get("CLIENT_CONCURRENCY", 4)),
+        interactive_max_chars=int(os.environ.get("INTERACTIVE_MAX_CHARS", 2000)))
+    client_id_header = os.environ.get("CLIENT_ID_HEADER")
+
     hostname = socket.gethostname()
     print("hostname: "+hostname)
     python_filename = __file__
@@ -289,7 +351,13 @@ if __name__ == "__main__":
             trg_lng = request.json.get('target_language', '')
 
             model_env = request.json.get('model_env', '')
-            result = runner.translate(text, src_lng, trg_lng, model_env)
+            debug = request.json.get('debug', False)
+            if not type(debug) is bool:
+                return {'error': '"debug" should be true or false'}, 400
+            lane = admission.classify(request.headers.get('X-Priority'), len(text))
+            client = request.headers.get(client_id_header) if client_id_header else None
+            with admission.admit(client or request.remote_addr, lane), admission.slot(lane):
+                result = runner.translate(text, src_lng, trg_lng, model_env, debug)
             errormsg = result[6]
             ok = True
             if errormsg != None:
@@ -299,6 +367,8 @@ if __name__ == "__main__":
             if errormsg != None:
                 retval['errormsg'] = errormsg
             return retval
+        except rejected as e:
+            return {'ok': False, 'errormsg': str(e)}, e.status, {'Retry-After': str(e.retry_after)}
         except Exception as e:
             retval = {"ok": False, "translation": "", "marked_input": "", "marked_translation": "", 
                       "ctranslate2_input": "", "ctranslate2_output": "", "model": "",
@@ -324,7 +394,16 @@ if __name__ == "__main__":
                     print (data)
                     modelinfo[i][key] = data
                     f.close()
-        return {'modelpath_default': runner.modelpath_default, 'modelinfo_default': modelinfo_default, 'modelpath_test': runner.modelpath_test, 'modelinfo_test':modelinfo_test, 'hostname': hostname, 'srcfilename': python_filename + " (modified UTC: "+str(modified)+")", 'version': version }
+        return {'modelpath_default': runner.modelpath_default, 'modelinfo_default': modelinfo_default, 'modelpath_test': runner.modelpath_test, 'modelinfo_test':modelinfo_test, 'loaded_models': sorted(runner.loaded_models), 'hostname': hostname, 'srcfilename': python_filename + " (modified UTC: "+str(modified)+")", 'version': version }
+
+    @app.route('/status')
+    def status():
+        return {**admission.status(), "pipeline": pipeline.status()}
+
+    @app.route('/debug/profile')
+    def debug_profile():
+        # Sampling-Profiler (pipeline/profiler.py), nur aktiv mit PROFILER_MAX_SECONDS
+        return profiler.profile_response(request.args)
 
     @app.route('/split_sentences', methods=['POST'])
     def split_sentences():
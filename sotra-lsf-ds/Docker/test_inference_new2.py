@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+# Tests für FairseqCTranslateRunner.translate ohne Modelle: Translator und BPE eines Modellpfads werden durch einfache
+# Attrappen ersetzt, Tokenizer und SentenceSplitter sind die echten.
+# Aufruf im Verzeichnis Docker/ (pipeline/ liegt zwei Ebenen höher):
+#   PYTHONPATH=../.. python -m unittest test_inference_new2
+
+import os
+import unittest
+
+try:
+    import inference_new2
+    missing = None
+except ImportError as e:  # ctranslate2, sacremoses, sentence_splitter oder youtokentome fehlt
+    inference_new2, missing = None, str(e)
+
+
+class fake_bpe:
+
+    def encode(self, sentences, output_type=None):
+        return [["▁" + word for word in sentence.split()] for sentence in sentences]
+
+
+class fake_result:
+
+    def __init__(self, hypothesis):
+        self.hypotheses = [hypothesis]
+
+
+class fake_translator:
+    # "übersetzt" jeden Satz in sich selbst (ohne Sprach-Token); ein leerer Satz wird zu einer Halluzination
+
+    def translate_batch(self, batch, **options):
+        return [fake_result(sentence[1:] or ["▁halluziniert"]) for sentence in batch]
+
+
+@unittest.skipIf(missing, f"dependencies missing: {missing}")
+class translate_test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Pfade der nonbreaking_prefix-Dateien sind relativ zu Docker/
+        cls.cwd = os.getcwd()
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        os.environ["VERBOSE"] = "0"
+        cls.runner = inference_new2.FairseqCTranslateRunner()
+        path = cls.runner.modeldir + cls.runner.modelpath_default["hsb_de"]
+        cls.runner.loaded_models[path] = {"translator": fake_translator(), "bpe": fake_bpe()}
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+
+    def test_debug_fields_empty_without_debug(self):
+        output, marked_input, marked_output, ctranslate2_input, ctranslate2_output, model, errormsg = \
+            self.runner.translate("To je test.", "hsb", "de", "")
+        self.assertIsNone(errormsg)
+        self.assertEqual(ctranslate2_input, "")
+        self.assertEqual(ctranslate2_output, "")
+
+    def test_debug_fields_with_debug(self):
+        result = self.runner.translate("To je test.", "hsb", "de", "", debug=True)
+        self.assertEqual(result[3], "<de>▁To▁je▁test▁.")
+        self.assertEqual(result[4], "▁To▁je▁test▁.")
+
+    def test_debug_fields_empty_with_verbose(self):
+        # VERBOSE schreibt die Zwischenergebnisse nur auf stdout
+        self.runner.verbose = 1
+        try:
+            result = self.runner.translate("To je test.", "hsb", "de", "")
+        finally:
+            self.runner.verbose = 0
+        self.assertEqual((result[3], result[4]), ("", ""))
+
+    def test_empty_line_not_translated(self):
+        # in marked_translation wird die Übersetzung einer leeren Eingabezeile verworfen, nur der Strukturmarker bleibt
+        result = self.runner.translate("To je test.\n\nTo je druhi test.", "hsb", "de", "")
+        self.assertEqual(result[2], "To je test.¶\n¶\nTo je druhi test.¶")
+
+    def test_evict_skips_model_being_loaded(self):
+        # ein Modell, dessen loading_lock eine Anfrage hält, wird erst beim nächsten Aufruf freigegeben
+        path = self.runner.modeldir + "idle_test_model/"
+        self.runner.loaded_models[path] = {"translator": fake_translator(), "bpe": fake_bpe(), "last_used": 0}
+        loading_lock = self.runner.loading_locks.setdefault(path, inference_new2.threading.Lock())
+        with loading_lock:
+            self.runner.evict_idle_models()
+            self.assertIn(path, self.runner.loaded_models)
+        self.runner.evict_idle_models()
+        self.assertNotIn(path, self.runner.loaded_models)
+
+
+if __name__ == "__main__":
+    unittest.main()